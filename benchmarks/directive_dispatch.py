@@ -0,0 +1,120 @@
+"""
+    Routing cost of the DirectiveRegistry lookup against the namespace if/elif
+    chain lambda_handler/handle_command used before it. Only routing is timed,
+    handlers are no-ops. --extra-controllers adds that many more namespaces to
+    both, which is what each new controller costs the chain.
+
+    python benchmarks/directive_dispatch.py [--iterations N] [--extra-controllers N]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from alexa.dispatch import DirectiveRegistry  # noqa: E402
+
+CAPABILITIES = {
+    "Alexa.PowerController": {"supported": [{"name": "powerState"}]},
+    "Alexa.PercentageController": {"supported": [{"name": "percentage"}]},
+    "Alexa.ToggleController": {
+        "supported": [{"name": "toggleState"}],
+        "instance": "Fan.Oscillate"
+    },
+}
+
+HEADERS = [
+    {"namespace": "Alexa.Authorization", "name": "AcceptGrant"},
+    {"namespace": "Alexa.Discovery", "name": "Discover"},
+    {"namespace": "Alexa", "name": "ReportState"},
+    {"namespace": "Alexa.PowerController", "name": "TurnOn"},
+    {"namespace": "Alexa.PowerController", "name": "TurnOff"},
+    {"namespace": "Alexa.ToggleController", "name": "TurnOn"},
+    {"namespace": "Alexa.PercentageController", "name": "SetPercentage"},
+    {"namespace": "Alexa.Unknown", "name": "Unknown"},
+]
+
+
+def noop(*_) -> None:
+    return None
+
+
+def build_registry(extra_namespaces: list) -> DirectiveRegistry:
+    registry = DirectiveRegistry(CAPABILITIES)
+
+    for namespace in extra_namespaces:
+        registry.register(namespace, ("SetValue",))(noop)
+
+    registry.register("Alexa.Authorization", ("AcceptGrant",))(noop)
+    registry.register("Alexa.Discovery", ("Discover",))(noop)
+    registry.register("Alexa", ("ReportState",))(noop)
+    registry.register("Alexa.PowerController", ("TurnOn", "TurnOff"))(noop)
+    registry.register(
+        "Alexa.ToggleController", ("TurnOn", "TurnOff"), instance="Fan.Oscillate"
+    )(noop)
+    registry.register("Alexa.PercentageController", ("SetPercentage",))(noop)
+
+    return registry
+
+
+def route_with_chain(header: dict, extra_namespaces: list) -> object:
+    # mirrors the lookups the old if/elif chain did per request
+    name = header["name"]
+    namespace = header["namespace"]
+
+    for extra_namespace in extra_namespaces:
+        if namespace == extra_namespace and name == "SetValue":
+            return noop
+
+    if namespace == "Alexa.Authorization":
+        if name == "AcceptGrant":
+            return noop
+    if namespace == "Alexa.Discovery" and name == "Discover":
+        return noop
+    if namespace == "Alexa" and name == "ReportState":
+        return noop
+    if CAPABILITIES.get(namespace, None):
+        if namespace == "Alexa.PowerController":
+            CAPABILITIES[namespace]["supported"][0]["name"]
+            return noop
+        elif namespace == "Alexa.ToggleController":
+            instance = header.get("instance", CAPABILITIES[namespace].get("instance"))
+            if instance == "Fan.Oscillate":
+                CAPABILITIES[namespace]["supported"][0]["name"]
+                return noop
+        elif namespace == "Alexa.PercentageController" and name == "SetPercentage":
+            CAPABILITIES[namespace]["supported"][0]["name"]
+            return noop
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--extra-controllers", type=int, default=0)
+    args = parser.parse_args()
+
+    extra_namespaces = [
+        f"Alexa.Benchmark{index}Controller"
+        for index in range(args.extra_controllers)
+    ]
+
+    registry = build_registry(extra_namespaces)
+
+    def run_chain() -> None:
+        for header in HEADERS:
+            route_with_chain(header, extra_namespaces)
+
+    def run_registry() -> None:
+        for header in HEADERS:
+            registry.resolve(header)
+
+    for label, run in (("if/elif chain", run_chain), ("registry", run_registry)):
+        elapsed = min(timeit.repeat(run, number=args.iterations, repeat=5))
+        per_directive = elapsed / (args.iterations * len(HEADERS)) * 1e9
+        print(f"{label:<14} {per_directive:8.1f} ns/directive")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+"""
+    Drives lambda_handler and the consumer's main() loop together, in one
+    process, against an in-memory SQS and a local aiohttp stand-in for the fan
+    backend. Sends a mix of directives from concurrent "Lambda invocations" and
+    reports throughput, latency percentiles per directive, the consumer's stage
+    histograms, any reply that reached the wrong invocation and every reply
+    lost to a deadline.
+
+    python benchmarks/end_to_end.py [--directives N] [--concurrency N]
+        [--backend-latency-ms N] [--backend-error-rate R] [--seed N]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+sys.path.insert(0, SRC_DIR)
+
+# read by lambda_function at import, keep its own logging out of the numbers
+os.environ.setdefault("LOG_SAMPLE_RATE", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("LOG_BUFFERED", "0")
+
+from aiohttp import web  # noqa: E402
+
+import lambda_function  # noqa: E402
+from clients import SqliteStateSnapshotStore, SqsClient  # noqa: E402
+from consumer import main as consumer_main  # noqa: E402
+from utils.metrics import metrics  # noqa: E402
+from utils.shard_routing import (  # noqa: E402
+    DEFAULT_SHARD,
+    FAN_SHARDS,
+    HOME_SHARDS,
+    HomeShard,
+)
+
+HOME_QUEUE = "home"
+ALEXA_QUEUE = "alexa"
+
+# "all" is the group of both fans, see FAN_GROUPS
+FAN_IDS = ("0", "4", "all")
+
+DIRECTIVE_MIX = (
+    ("PowerController", 0.3),
+    ("PercentageController", 0.3),
+    ("ToggleController", 0.15),
+    ("ReportState", 0.15),
+    ("Discovery", 0.1),
+)
+
+
+class InMemorySqs:
+    """
+        The subset of the boto3 SQS client SqsClient uses. Received messages
+        stay invisible until they are deleted, calls are counted per API.
+    """
+
+    def __init__(self) -> None:
+        self.queues = defaultdict(deque)
+        self.tags = {}
+        self.in_flight = {}
+        self.calls = defaultdict(int)
+        self.condition = threading.Condition()
+        self.closed = False
+
+    def send_message(
+        self,
+        QueueUrl: str,
+        MessageBody: str,
+        MessageAttributes: dict = None
+    ) -> dict:
+        self.calls["send_message"] += 1
+
+        return {"MessageId": self.enqueue(QueueUrl, MessageBody, MessageAttributes)}
+
+    def send_message_batch(self, QueueUrl: str, Entries: list) -> dict:
+        self.calls["send_message_batch"] += 1
+
+        for entry in Entries:
+            self.enqueue(
+                QueueUrl, entry["MessageBody"], entry.get("MessageAttributes")
+            )
+
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+    def receive_message(
+        self,
+        QueueUrl: str,
+        MaxNumberOfMessages: int = 1,
+        WaitTimeSeconds: int = 0,
+        MessageAttributeNames: list = None
+    ) -> dict:
+        self.calls["receive_message"] += 1
+        deadline = time.monotonic() + WaitTimeSeconds
+        queue = self.queues[QueueUrl]
+        messages = []
+
+        with self.condition:
+            while not queue and not self.closed:
+                remaining = deadline - time.monotonic()
+
+                if remaining <= 0:
+                    break
+
+                self.condition.wait(remaining)
+
+            while queue and len(messages) < MaxNumberOfMessages:
+                message = queue.popleft()
+                receipt_handle = uuid.uuid4().hex
+
+                self.in_flight[receipt_handle] = (QueueUrl, message)
+                messages.append({**message, "ReceiptHandle": receipt_handle})
+
+        return {"Messages": messages} if messages else {}
+
+    def delete_message(self, QueueUrl: str, ReceiptHandle: str) -> dict:
+        self.calls["delete_message"] += 1
+
+        with self.condition:
+            self.in_flight.pop(ReceiptHandle, None)
+
+        return {}
+
+    def delete_message_batch(self, QueueUrl: str, Entries: list) -> dict:
+        self.calls["delete_message_batch"] += 1
+
+        with self.condition:
+            for entry in Entries:
+                self.in_flight.pop(entry["ReceiptHandle"], None)
+
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+    def create_queue(
+        self,
+        QueueName: str,
+        Attributes: dict = None,
+        tags: dict = None
+    ) -> dict:
+        self.calls["create_queue"] += 1
+
+        with self.condition:
+            self.tags[QueueName] = dict(tags or {})
+
+        return {"QueueUrl": QueueName}
+
+    def delete_queue(self, QueueUrl: str) -> dict:
+        self.calls["delete_queue"] += 1
+
+        with self.condition:
+            self.tags.pop(QueueUrl, None)
+            self.queues.pop(QueueUrl, None)
+
+        return {}
+
+    def tag_queue(self, QueueUrl: str, Tags: dict) -> dict:
+        self.calls["tag_queue"] += 1
+
+        with self.condition:
+            self.tags[QueueUrl].update(Tags)
+
+        return {}
+
+    def list_queue_tags(self, QueueUrl: str) -> dict:
+        self.calls["list_queue_tags"] += 1
+
+        with self.condition:
+            return {"Tags": dict(self.tags.get(QueueUrl, {}))}
+
+    def list_queues(self, QueueNamePrefix: str = "", **_) -> dict:
+        self.calls["list_queues"] += 1
+
+        with self.condition:
+            return {"QueueUrls": [
+                queue_url for queue_url in self.tags
+                if queue_url.startswith(QueueNamePrefix)
+            ]}
+
+    def enqueue(self, queue_url: str, body: str, attributes: dict) -> str:
+        message = {
+            "MessageId": uuid.uuid4().hex,
+            "Body": body,
+            "MessageAttributes": attributes or {}
+        }
+
+        with self.condition:
+            self.queues[queue_url].append(message)
+            self.condition.notify_all()
+
+        return message["MessageId"]
+
+    def pending(self, queue_url: str) -> int:
+        with self.condition:
+            return len(self.queues[queue_url]) + sum(
+                1 for queue, _ in self.in_flight.values() if queue == queue_url
+            )
+
+    def close(self) -> None:
+        # wakes every long poll so no executor thread outlives the run
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class FakeBackend:
+    """
+        GET/PATCH /fans/{fan_id}, PATCH merges the body into the fan state.
+        Each request waits latency_ms (+-50%) and fails with 503 at error_rate.
+    """
+
+    def __init__(self, latency_ms: float, error_rate: float, seed: int) -> None:
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.fans = defaultdict(
+            lambda: {"state": False, "speed": 0, "rotation_direction": 0}
+        )
+        self.requests = 0
+        self.errors = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/fans/{fan_id}", self.get_fan)
+        app.router.add_patch("/fans/{fan_id}", self.patch_fan)
+        return app
+
+    async def get_fan(self, request: web.Request) -> web.Response:
+        if (failure := await self.__simulate_()) is not None:
+            return failure
+
+        return web.json_response(self.fans[request.match_info["fan_id"]])
+
+    async def patch_fan(self, request: web.Request) -> web.Response:
+        if (failure := await self.__simulate_()) is not None:
+            return failure
+
+        state = self.fans[request.match_info["fan_id"]]
+        state.update(
+            (key, value) for key, value in (await request.json()).items()
+            if key in state
+        )
+
+        return web.json_response(state)
+
+    async def __simulate_(self) -> web.Response:
+        self.requests += 1
+
+        await asyncio.sleep(
+            self.latency_ms * self.random.uniform(0.5, 1.5) / 1000
+        )
+
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=503)
+
+        return None
+
+
+def build_directive(kind: str, rng: random.Random) -> dict:
+    header = {
+        "messageId": uuid.uuid4().hex,
+        "correlationToken": uuid.uuid4().hex,
+        "payloadVersion": "3"
+    }
+    payload = {}
+
+    if kind == "PowerController":
+        header.update(namespace="Alexa.PowerController",
+                      name=rng.choice(("TurnOn", "TurnOff")))
+    elif kind == "PercentageController":
+        header.update(namespace="Alexa.PercentageController",
+                      name="SetPercentage")
+        payload["percentage"] = rng.choice((0, 33, 66, 100))
+    elif kind == "ToggleController":
+        header.update(namespace="Alexa.ToggleController",
+                      name=rng.choice(("TurnOn", "TurnOff")),
+                      instance="Fan.Oscillate")
+    elif kind == "ReportState":
+        header.update(namespace="Alexa", name="ReportState")
+    else:
+        header.update(namespace="Alexa.Discovery", name="Discover")
+        payload["scope"] = {"type": "BearerToken", "token": "benchmark"}
+
+    directive = {"header": header, "payload": payload}
+
+    if kind != "Discovery":
+        directive["endpoint"] = {"endpointId": rng.choice(FAN_IDS)}
+
+    return {"directive": directive}
+
+
+def percentile(samples: list, rank: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(rank * len(ordered)))]
+
+
+def wire_stand_ins(sqs: SqsClient, store: object, backend_url: str) -> dict:
+    """
+        Points both sides at the stand-ins and returns the misrouted reply
+        counter, a reply is misrouted when its correlation id is not the one
+        of the command the invocation sent.
+    """
+    # a single shard holding every fan, served by the one consumer
+    shard = HomeShard(DEFAULT_SHARD, HOME_QUEUE, backend_url)
+    HOME_SHARDS[DEFAULT_SHARD] = shard
+    FAN_SHARDS.clear()
+    consumer_main.HOME_SHARD = shard
+
+    # only replies to commands without a reply queue land here
+    consumer_main.ALEXA_QUEUE = ALEXA_QUEUE
+
+    lambda_function.get_sqs_client = lambda: sqs
+    lambda_function.get_state_store = lambda: store
+    # the stage histograms are shared with the consumer here, keep them whole
+    lambda_function.publish_metrics = lambda: None
+
+    consumer_main.get_state_store = lambda: store
+
+    misrouted = {"replies": 0}
+    lock = threading.Lock()
+    fetch_reply_message = lambda_function.fetch_reply_message
+
+    def checked_fetch(replies: object, correlation_id: str, *args):
+        response = fetch_reply_message(replies, correlation_id, *args)
+
+        if response.correlation_id not in (None, correlation_id):
+            with lock:
+                misrouted["replies"] += 1
+
+        return response
+
+    lambda_function.fetch_reply_message = checked_fetch
+
+    return misrouted
+
+
+async def run(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    kinds, weights = zip(*DIRECTIVE_MIX)
+    directives = [
+        (kind, build_directive(kind, rng))
+        for kind in rng.choices(kinds, weights, k=args.directives)
+    ]
+
+    backend = FakeBackend(args.backend_latency_ms, args.backend_error_rate, args.seed)
+    runner = web.AppRunner(backend.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+
+    workdir = tempfile.mkdtemp(prefix="arno_e2e_")
+    consumer_main.LOG_FILE_PATH = os.path.join(workdir, "consumer.log")
+    consumer_main.METRICS_PATH = os.path.join(workdir, "consumer_metrics.prom")
+
+    fake_sqs = InMemorySqs()
+    sqs = SqsClient(fake_sqs)
+    store = SqliteStateSnapshotStore(os.path.join(workdir, "state.db"))
+    misrouted = wire_stand_ins(sqs, store, f"http://127.0.0.1:{port}/fans")
+
+    consumer_task = asyncio.ensure_future(
+        consumer_main.main(args.max_concurrency, sqs=sqs)
+    )
+
+    loop = asyncio.get_running_loop()
+    invocations = ThreadPoolExecutor(max_workers=args.concurrency)
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    timeouts = defaultdict(int)
+
+    def timed_handler(request: dict) -> tuple:
+        # timed on the invocation thread, so the wait for a free thread is
+        # not counted as directive latency
+        started_at = time.perf_counter()
+        response = lambda_function.lambda_handler(request, None)
+
+        return response, time.perf_counter() - started_at
+
+    async def invoke(kind: str, request: dict) -> None:
+        response, latency = await loop.run_in_executor(
+            invocations, timed_handler, request
+        )
+        latencies[kind].append(latency)
+
+        if lambda_function.is_error_response(response):
+            errors[kind] += 1
+
+            # the consumer's reply never made it back in time
+            if "no reply for command" in \
+                    response["event"]["payload"].get("message", ""):
+                timeouts[kind] += 1
+
+    started_at = time.perf_counter()
+    log_stream = lambda_function.log_handler.setStream(io.StringIO())
+
+    # lambda_handler writes its logs and metrics to stdout, keep them out of
+    # the report; its log handler holds on to the stdout it was built with
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(invoke(kind, request) for kind, request in directives))
+
+    lambda_function.log_handler.setStream(log_stream)
+
+    elapsed = time.perf_counter() - started_at
+
+    consumer_task.cancel()
+    await asyncio.gather(consumer_task, return_exceptions=True)
+    fake_sqs.close()
+    invocations.shutdown()
+    await runner.cleanup()
+
+    print(
+        f"{args.directives} directives, {args.concurrency} concurrent, "
+        f"backend {args.backend_latency_ms}ms / {args.backend_error_rate:.0%} errors"
+    )
+    print(f"throughput {args.directives / elapsed:9.1f} directives/s")
+    print()
+
+    for kind, _ in DIRECTIVE_MIX:
+        if not latencies[kind]:
+            continue
+
+        samples = latencies[kind]
+        print(
+            f"{kind:<22} n={len(samples):5d} errors={errors[kind]:4d} "
+            f"timeouts={timeouts[kind]:4d} "
+            f"p50={percentile(samples, 0.50) * 1e3:8.1f}ms "
+            f"p95={percentile(samples, 0.95) * 1e3:8.1f}ms "
+            f"p99={percentile(samples, 0.99) * 1e3:8.1f}ms"
+        )
+
+    print()
+
+    for stage, summary in sorted(metrics.summary().items()):
+        print(
+            f"stage {stage:<26} n={summary['count']:5d} "
+            f"p50<={summary['p50']:7.1f}ms p95<={summary['p95']:7.1f}ms "
+            f"p99<={summary['p99']:7.1f}ms"
+        )
+
+    print()
+    print(f"misrouted replies          {misrouted['replies']}")
+    print(
+        "unclaimed replies          "
+        f"{sum(fake_sqs.pending(queue) for queue in fake_sqs.tags)} in reply "
+        f"queues, {fake_sqs.pending(ALEXA_QUEUE)} in {ALEXA_QUEUE}"
+    )
+    print(
+        "expired commands dropped   "
+        f"{metrics.counters.get('expired_commands', 0)}"
+    )
+    print(
+        "expired replies dropped    "
+        f"{metrics.counters.get('expired_replies_dropped', 0)} by the consumer, "
+        f"{metrics.counters.get('orphan_replies_deleted', 0)} by the Lambda"
+    )
+    print(
+        "sqs calls                  "
+        + ", ".join(
+            f"{api} {count}" for api, count in sorted(fake_sqs.calls.items())
+        )
+    )
+    print(f"backend requests / errors  {backend.requests} / {backend.errors}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--directives", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--max-concurrency", type=int, default=10)
+    parser.add_argument("--backend-latency-ms", type=float, default=50)
+    parser.add_argument("--backend-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+    Cold import time of lambda_function and per-invocation overhead of
+    lambda_handler for directives that never leave the Lambda.
+
+    python benchmarks/lambda_startup.py [--cold-runs N] [--invocations N]
+"""
+import argparse
+import contextlib
+import io
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+COLD_IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import lambda_function; "
+    "print(time.perf_counter() - start)"
+)
+
+DISCOVERY_REQUEST = {
+    "directive": {
+        "header": {
+            "namespace": "Alexa.Discovery",
+            "name": "Discover",
+            "messageId": "benchmark",
+            "payloadVersion": "3"
+        },
+        "payload": {"scope": {"type": "BearerToken", "token": "benchmark"}}
+    }
+}
+
+INVALID_REQUEST = {
+    "directive": {
+        "header": {
+            "namespace": "Alexa.Unknown",
+            "name": "Unknown",
+            "messageId": "benchmark",
+            "payloadVersion": "3"
+        },
+        "payload": {}
+    }
+}
+
+
+def percentile(samples: list, rank: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(rank * len(ordered)))]
+
+
+def report(label: str, samples: list, unit: str, scale: float) -> None:
+    print(
+        f"{label:<28} p50={percentile(samples, 0.50) * scale:9.2f}{unit} "
+        f"p99={percentile(samples, 0.99) * scale:9.2f}{unit} "
+        f"mean={statistics.mean(samples) * scale:9.2f}{unit}"
+    )
+
+
+def measure_cold_import(runs: int) -> list:
+    samples = []
+
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", COLD_IMPORT_SNIPPET],
+            cwd=SRC_DIR,
+            capture_output=True,
+            text=True
+        )
+
+        if result.returncode != 0:
+            raise RuntimeError(f"importing lambda_function failed:\n{result.stderr}")
+
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+
+    return samples
+
+
+@contextlib.contextmanager
+def redirect_log_handler(handler: logging.Handler, stream: io.StringIO) -> None:
+    # an unbuffered handler keeps the stdout it was built with, which
+    # redirect_stdout does not reach
+    if not isinstance(handler, logging.StreamHandler):
+        yield
+        return
+
+    previous = handler.setStream(stream)
+
+    try:
+        yield
+    finally:
+        handler.setStream(previous)
+
+
+def measure_invocations(request: dict, invocations: int) -> list:
+    sys.path.insert(0, SRC_DIR)
+
+    import lambda_function
+
+    samples = []
+
+    # the log line of every invocation (a full dump for error responses) and
+    # the EMF documents of publish_metrics are part of the cost, they are
+    # written to a sink instead of the terminal
+    with contextlib.redirect_stdout(io.StringIO()) as sink, \
+            redirect_log_handler(lambda_function.log_handler, sink):
+        for _ in range(invocations):
+            start = time.perf_counter()
+            lambda_function.lambda_handler(request, None)
+            samples.append(time.perf_counter() - start)
+
+            sink.seek(0)
+            sink.truncate()
+
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cold-runs", type=int, default=20)
+    parser.add_argument("--invocations", type=int, default=2000)
+    args = parser.parse_args()
+
+    report("cold import", measure_cold_import(args.cold_runs), "ms", 1e3)
+    report(
+        "warm Discovery",
+        measure_invocations(DISCOVERY_REQUEST, args.invocations),
+        "us",
+        1e6
+    )
+    report(
+        "warm invalid directive",
+        measure_invocations(INVALID_REQUEST, args.invocations),
+        "us",
+        1e6
+    )
+
+
+if __name__ == "__main__":
+    main()
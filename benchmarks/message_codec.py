@@ -0,0 +1,105 @@
+"""
+    Encode/decode throughput of ArnoCommand and ArnoResponse with the slot
+    driven codec (with and without orjson) against the previous dir()/regex
+    based encoder and decoder.
+
+    python benchmarks/message_codec.py [--iterations N]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from commands import ArnoCommand  # noqa: E402
+from models import ArnoResponse  # noqa: E402
+from utils import slot_properties  # noqa: E402
+from utils.dict_public_properties import build_dict_public_properties  # noqa: E402
+
+ORJSON = slot_properties.orjson
+
+
+class LegacyEncoder(json.JSONEncoder):
+    def default(self, o: object) -> dict:
+        return build_dict_public_properties(o)
+
+
+def legacy_decode(cls: type, s: str) -> object:
+    obj = cls()
+
+    for key, value in json.loads(s).items():
+        if key in dir(obj):
+            setattr(obj, key, value)
+
+    return obj
+
+
+def build_samples() -> tuple:
+    command = ArnoCommand(fan_id=4, speed=70, rotation_direction=1, state=True)
+    response = ArnoResponse(
+        status_code=200,
+        response_message={"state": True, "speed": 70, "rotation_direction": 1},
+        success=True,
+        correlation_id=command.correlation_id,
+        state_age_ms=0
+    )
+
+    return command, response
+
+
+def throughput(run, iterations: int) -> float:
+    return iterations / min(timeit.repeat(run, number=iterations, repeat=5))
+
+
+def report(label: str, message: object, iterations: int) -> None:
+    cls = type(message)
+    encoded = str(message)
+
+    paths = (
+        (
+            "legacy",
+            lambda: json.dumps(message, cls=LegacyEncoder),
+            lambda: legacy_decode(cls, encoded)
+        ),
+        (
+            "slots",
+            lambda: slot_properties.encode_slot_properties(message),
+            lambda: slot_properties.decode_slot_properties(cls, encoded)
+        ),
+    )
+
+    for backend in ("json", "orjson"):
+        if backend == "orjson" and ORJSON is None:
+            print(f"{label:<14} orjson not installed, skipped")
+            continue
+
+        slot_properties.orjson = ORJSON if backend == "orjson" else None
+
+        for path, encode, decode in paths:
+            if path == "legacy" and backend == "orjson":
+                continue
+
+            print(
+                f"{label:<14} {path + '/' + backend:<14} "
+                f"encode {throughput(encode, iterations):>10,.0f}/s "
+                f"decode {throughput(decode, iterations):>10,.0f}/s"
+            )
+
+    slot_properties.orjson = ORJSON
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    command, response = build_samples()
+
+    report("ArnoCommand", command, args.iterations)
+    report("ArnoResponse", response, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import uuid
+from functools import lru_cache, reduce
+from operator import add
+
+from alexa.models import ArnoFanDiscoveryResponse
+from utils.shard_routing import shard_for_fan
+
+# Every fan exposed to Alexa. "capabilities" optionally restricts the
+# interfaces advertised for a fan, all supported ones are exposed otherwise.
+FAN_REGISTRY = (
+    {"endpoint_id": 0, "friendly_name": "Ventilador 0"},
+    {"endpoint_id": 4, "friendly_name": "Ventilador 4"},
+)
+
+# Groups are endpoints of their own, a directive to one becomes a single
+# command listing its fans. A group's fans must all belong to one home shard.
+FAN_GROUPS = (
+    {
+        "endpoint_id": "all",
+        "friendly_name": "Todos os ventiladores",
+        "fan_ids": (0, 4)
+    },
+)
+
+
+def validate_fan_groups(groups: tuple) -> None:
+    # a group command is posted to a single shard's queue, whose consumer
+    # then calls the backend of every fan in it
+    for group in groups:
+        if not group["fan_ids"]:
+            raise ValueError(f"fan group {group['endpoint_id']} has no fans")
+
+        shards = {shard_for_fan(fan_id).name for fan_id in group["fan_ids"]}
+
+        if len(shards) > 1:
+            raise ValueError(
+                f"fan group {group['endpoint_id']} spans home shards "
+                f"{', '.join(sorted(shards))}"
+            )
+
+
+validate_fan_groups(FAN_GROUPS)
+
+BASE_INTERFACE = "Alexa"
+
+
+def filter_capabilities(endpoint: dict, interfaces: tuple) -> None:
+    endpoint["capabilities"] = [
+        capability for capability in endpoint["capabilities"]
+        if capability["interface"] in interfaces
+        or capability["interface"] == BASE_INTERFACE
+    ]
+
+
+def find_group_fan_ids(endpoint_id: object) -> tuple:
+    for group in FAN_GROUPS:
+        if str(group["endpoint_id"]) == str(endpoint_id):
+            return group["fan_ids"]
+
+    return None
+
+
+@lru_cache(maxsize=None)
+def build_discovery_template() -> dict:
+    discovery_response = reduce(add, (
+        ArnoFanDiscoveryResponse(
+            friendly_name=fan["friendly_name"],
+            endpoint_id=fan["endpoint_id"]
+        )
+        for fan in FAN_REGISTRY + FAN_GROUPS
+    )).get()
+
+    interfaces_by_endpoint = {
+        str(fan["endpoint_id"]): fan["capabilities"]
+        for fan in FAN_REGISTRY + FAN_GROUPS if fan.get("capabilities")
+    }
+
+    for endpoint in discovery_response["event"]["payload"]["endpoints"]:
+        if (interfaces := interfaces_by_endpoint.get(str(endpoint["endpointId"]))):
+            filter_capabilities(endpoint, interfaces)
+
+    return discovery_response
+
+
+def build_discovery_response() -> dict:
+    # the endpoint list is shared with the cached template, only the header is
+    # rebuilt so every response still carries its own messageId
+    template = build_discovery_template()
+
+    return {
+        **template,
+        "event": {
+            **template["event"],
+            "header": {
+                **template["event"]["header"],
+                "messageId": str(uuid.uuid4())
+            }
+        }
+    }
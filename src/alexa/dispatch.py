@@ -0,0 +1,67 @@
+from typing import Callable, NamedTuple
+
+
+class DirectiveRoute(NamedTuple):
+    handler: Callable
+    namespace: str
+    name: str
+    instance: str
+    # name of the reported property, e.g. "powerState" for PowerController
+    property_name: str
+
+
+class DirectiveRegistry:
+    """
+        Maps (namespace, name, instance) to a handler. The capability metadata a
+        handler needs is looked up once at registration instead of per request.
+    """
+
+    __slots__ = [
+        "__capabilities_",
+        "__default_instances_",
+        "__routes_"
+    ]
+
+    __capabilities_: dict
+    __default_instances_: dict
+    __routes_: dict
+
+    def __init__(self, capabilities: dict) -> None:
+        self.__capabilities_ = capabilities
+        self.__default_instances_ = {
+            namespace: capability["instance"]
+            for namespace, capability in capabilities.items()
+            if capability.get("instance")
+        }
+        self.__routes_ = {}
+
+    def register(
+        self,
+        namespace: str,
+        names: tuple,
+        instance: str = None
+    ) -> Callable:
+        capability = self.__capabilities_.get(namespace, {})
+        supported = capability.get("supported") or [{}]
+
+        def decorator(handler: Callable) -> Callable:
+            for name in names:
+                self.__routes_[(namespace, name, instance)] = DirectiveRoute(
+                    handler=handler,
+                    namespace=namespace,
+                    name=name,
+                    instance=instance,
+                    property_name=supported[0].get("name")
+                )
+
+            return handler
+
+        return decorator
+
+    def resolve(self, header: dict) -> DirectiveRoute:
+        namespace = header["namespace"]
+
+        # directives may omit the instance, Alexa then means the default one
+        instance = header.get("instance") or self.__default_instances_.get(namespace)
+
+        return self.__routes_.get((namespace, header["name"], instance))
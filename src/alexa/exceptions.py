@@ -0,0 +1,9 @@
+class HandleCommandException(Exception):
+    """
+        A directive reached the fan but could not be carried out; message is
+        sent back to Alexa in the ENDPOINT_UNREACHABLE response.
+    """
+
+    def __init__(self, message: str = None) -> None:
+        super().__init__(message)
+        self.message = message
@@ -0,0 +1,8 @@
+from .alexa_response import AlexaResponse, AlexaResponseBuilder
+from .arno_fan_discovery_response import ArnoFanDiscoveryResponse
+
+__all__ = [
+    "AlexaResponse",
+    "AlexaResponseBuilder",
+    "ArnoFanDiscoveryResponse",
+]
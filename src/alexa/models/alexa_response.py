@@ -157,3 +157,97 @@ class AlexaResponse:
             self.event['payload']['endpoints'] = []
 
         self.event['payload']['endpoints'] = payload_endpoints
+
+
+class AlexaResponseBuilder:
+    """
+        Hot path counterpart of AlexaResponse for directive replies. Builds the
+        same dict as AlexaResponse.get() from a fixed layout, samples the time
+        once per response and has no side effects on get().
+    """
+
+    __slots__ = [
+        "__response_",
+        "__properties_",
+        "__time_of_sample_"
+    ]
+
+    __response_: dict
+    __properties_: list
+    __time_of_sample_: str
+
+    def __init__(
+        self,
+        namespace: str = 'Alexa',
+        name: str = 'Response',
+        endpoint_id: str = 'INVALID',
+        correlation_token: str = None,
+        payload: dict = None,
+        token: str = 'INVALID',
+        payload_version: str = '3'
+    ) -> None:
+        header = {
+            'namespace': namespace,
+            'name': name,
+            'messageId': str(uuid.uuid4()),
+            'payloadVersion': payload_version
+        }
+
+        if correlation_token is not None:
+            header['correlation_token'] = correlation_token
+
+        event = {'header': header}
+
+        # No endpoint property in an AcceptGrant or Discover request.
+        if name != 'AcceptGrant.Response' and name != 'Discover.Response':
+            event['endpoint'] = {
+                'scope': {'type': 'BearerToken', 'token': token},
+                'endpointId': endpoint_id
+            }
+
+        event['payload'] = {} if payload is None else payload
+
+        self.__response_ = {'event': event}
+        self.__properties_ = None
+        self.__time_of_sample_ = None
+
+    def add_context_property(
+        self,
+        namespace: str,
+        name: str,
+        value: object,
+        instance: str = None,
+        uncertainty_in_milliseconds: int = 0
+    ) -> None:
+        if self.__properties_ is None:
+            self.__time_of_sample_ = get_utc_timestamp()
+            self.__properties_ = [{
+                'namespace': 'Alexa.EndpointHealth',
+                'name': 'connectivity',
+                'value': {'value': 'OK'},
+                'timeOfSample': self.__time_of_sample_,
+                'uncertaintyInMilliseconds': 0
+            }]
+
+        context_property = {
+            'namespace': namespace,
+            'name': name,
+            'value': value,
+            'timeOfSample': self.__time_of_sample_,
+            'uncertaintyInMilliseconds': uncertainty_in_milliseconds
+        }
+
+        if instance:
+            context_property['instance'] = instance
+
+        self.__properties_.append(context_property)
+
+    def get(self) -> dict:
+        if self.__properties_ is None:
+            return self.__response_
+
+        # AlexaResponse.get() puts the context ahead of the event
+        return {
+            'context': {'properties': self.__properties_},
+            'event': self.__response_['event']
+        }
@@ -0,0 +1,72 @@
+import copy
+
+from .alexa_response import AlexaResponse
+
+# every interface an Arno fan supports, keyed by namespace; "supported" lists
+# the reported properties and "instance" names the single controller instance
+SUPPORTED_CAPABILITIES = {
+    "Alexa.PowerController": {
+        "supported": [{"name": "powerState"}]
+    },
+    "Alexa.PercentageController": {
+        "supported": [{"name": "percentage"}]
+    },
+    "Alexa.ToggleController": {
+        "instance": "Fan.Oscillate",
+        "supported": [{"name": "toggleState"}],
+        "capabilityResources": {
+            "friendlyNames": [{
+                "@type": "asset",
+                "value": {"assetId": "Alexa.Setting.Oscillate"}
+            }]
+        }
+    },
+    "Alexa.EndpointHealth": {
+        "supported": [{"name": "connectivity"}]
+    },
+}
+
+
+class ArnoFanDiscoveryResponse(AlexaResponse):
+    """
+        Discover.Response advertising one fan with every supported interface.
+        Responses add up, fan_0 + fan_4 lists both endpoints.
+    """
+
+    def __init__(self, friendly_name: str, endpoint_id: object) -> None:
+        super().__init__(namespace="Alexa.Discovery", name="Discover.Response")
+
+        capabilities = [self.create_payload_endpoint_capability()]
+
+        for namespace, capability in SUPPORTED_CAPABILITIES.items():
+            capabilities.append(self.create_payload_endpoint_capability(
+                interface=namespace,
+                instance=capability.get("instance"),
+                supported=capability["supported"],
+                retrievable=True,
+                capabilityResources=capability.get("capabilityResources")
+            ))
+
+        self.add_payload_endpoint(
+            endpoint_id=str(endpoint_id),
+            friendly_name=friendly_name,
+            description="Ventilador de teto Arno Vx10",
+            manufacturer_name="Arno",
+            manufacturer="Arno",
+            model_name="Vx10",
+            display_categories=["FAN"],
+            capabilities=capabilities
+        )
+
+    @classmethod
+    def supported_capabilities(cls) -> dict:
+        return copy.deepcopy(SUPPORTED_CAPABILITIES)
+
+    def __add__(self, other: "ArnoFanDiscoveryResponse") -> "ArnoFanDiscoveryResponse":
+        # get() writes the endpoints into the event, neither side may share it
+        combined = copy.deepcopy(self)
+        combined.set_payload_endpoint(
+            combined.payload_endpoints + copy.deepcopy(other.payload_endpoints)
+        )
+
+        return combined
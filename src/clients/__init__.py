@@ -0,0 +1,34 @@
+from importlib import import_module
+
+# aiohttp and boto3 are expensive to import and the Lambda only needs a few of
+# these, so submodules are imported the first time one of their names is used
+_EXPORTS = {
+    "AsyncSqsClient": ".async_sqs_client",
+    "CORRELATION_ID_ATTRIBUTE": ".sqs_client",
+    "CircuitBreaker": ".circuit_breaker",
+    "CircuitOpenError": ".circuit_breaker",
+    "DEADLINE_ATTRIBUTE": ".sqs_client",
+    "DeadlineExceededError": ".http_client",
+    "DynamoDbStateSnapshotStore": ".state_store",
+    "HttpClient": ".http_client",
+    "REPLY_QUEUE_IDLE_SEC": ".reply_queue",
+    "REPLY_QUEUE_PREFIX": ".reply_queue",
+    "ReplyQueue": ".reply_queue",
+    "SqliteStateSnapshotStore": ".state_store",
+    "SqsClient": ".sqs_client",
+    "StateSnapshotStore": ".state_store",
+    "is_idle_reply_queue": ".reply_queue",
+    "read_string_attribute": ".sqs_client",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> object:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+
+    return value
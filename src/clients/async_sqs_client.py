@@ -0,0 +1,95 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from .sqs_client import SqsClient
+
+SQS_THREAD_POOL_SIZE = 8
+
+
+class AsyncSqsClient:
+    """
+        Same interface as SqsClient, awaitable. boto3 calls block, so they run
+        on a dedicated thread pool and a 20s long-poll does not stall the loop.
+    """
+
+    __slots__ = [
+        "__client_",
+        "__executor_"
+    ]
+
+    __client_: SqsClient
+    __executor_: ThreadPoolExecutor
+
+    def __init__(
+        self,
+        client: SqsClient = None,
+        max_workers: int = SQS_THREAD_POOL_SIZE
+    ) -> None:
+        self.__client_ = client or SqsClient()
+        self.__executor_ = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="sqs"
+        )
+
+    async def send_message(
+        self,
+        sqs_url: str,
+        message: str,
+        attributes: dict = None
+    ) -> dict:
+        return await self.__run_(
+            self.__client_.send_message, sqs_url, message, attributes
+        )
+
+    async def send_messages(self, sqs_url: str, messages: list) -> list:
+        return await self.__run_(
+            self.__client_.send_messages, sqs_url, messages
+        )
+
+    async def fetch_messages(
+        self,
+        sqs_url: str,
+        max_messages: int = 1,
+        wait_time_seconds: int = 0,
+        attribute_names: list = None
+    ) -> dict:
+        return await self.__run_(
+            self.__client_.fetch_messages,
+            sqs_url,
+            max_messages,
+            wait_time_seconds,
+            attribute_names
+        )
+
+    async def delete_message(self, sqs_url: str, receipt_handle: str) -> dict:
+        return await self.__run_(
+            self.__client_.delete_message, sqs_url, receipt_handle
+        )
+
+    async def delete_messages(self, sqs_url: str, receipt_handles: list) -> list:
+        return await self.__run_(
+            self.__client_.delete_messages, sqs_url, receipt_handles
+        )
+
+    async def delete_queue(self, sqs_url: str) -> dict:
+        return await self.__run_(self.__client_.delete_queue, sqs_url)
+
+    async def list_queue_tags(self, sqs_url: str) -> dict:
+        return await self.__run_(self.__client_.list_queue_tags, sqs_url)
+
+    async def list_queues(self, prefix: str) -> list:
+        return await self.__run_(self.__client_.list_queues, prefix)
+
+    def close(self) -> None:
+        self.__executor_.shutdown(wait=False)
+
+    async def __aenter__(self) -> "AsyncSqsClient":
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        self.close()
+
+    async def __run_(self, method, *args) -> dict:
+        return await asyncio.get_running_loop().run_in_executor(
+            self.__executor_, method, *args
+        )
@@ -0,0 +1,76 @@
+import time
+
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT_SEC = 10
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, host: str, retry_in: float) -> None:
+        super().__init__(f"circuit for {host} is open, retry in {retry_in:.1f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+        Opens after failure_threshold consecutive failures and rejects calls
+        for reset_timeout seconds, then lets a single trial call through:
+        success closes the circuit again, failure reopens it.
+    """
+
+    __slots__ = [
+        "__host_",
+        "__failure_threshold_",
+        "__reset_timeout_",
+        "__failures_",
+        "__state_",
+        "__opened_at_"
+    ]
+
+    def __init__(
+        self,
+        host: str,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        reset_timeout: float = RESET_TIMEOUT_SEC
+    ) -> None:
+        self.__host_ = host
+        self.__failure_threshold_ = failure_threshold
+        self.__reset_timeout_ = reset_timeout
+        self.__failures_ = 0
+        self.__state_ = CLOSED
+        self.__opened_at_ = 0.0
+
+    @property
+    def state(self) -> str:
+        return self.__state_
+
+    def before_call(self) -> None:
+        if self.__state_ == CLOSED:
+            return
+
+        now = time.monotonic()
+        elapsed = now - self.__opened_at_
+
+        # open, or half open with the trial call still in flight
+        if elapsed < self.__reset_timeout_:
+            raise CircuitOpenError(self.__host_, self.__reset_timeout_ - elapsed)
+
+        # a trial that never reported back also ends up here after a while
+        self.__state_ = HALF_OPEN
+        self.__opened_at_ = now
+
+    def record_success(self) -> None:
+        self.__failures_ = 0
+        self.__state_ = CLOSED
+
+    def record_failure(self) -> None:
+        self.__failures_ += 1
+
+        if self.__state_ == HALF_OPEN or \
+                self.__failures_ >= self.__failure_threshold_:
+            self.__state_ = OPEN
+            self.__opened_at_ = time.monotonic()
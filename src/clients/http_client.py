@@ -1,27 +1,201 @@
 # import requests as req
+import asyncio
+import time
+from urllib.parse import urlsplit
+
 import aiohttp as req
 
+from utils.metrics import metrics
+
+from .circuit_breaker import (
+    FAILURE_THRESHOLD,
+    RESET_TIMEOUT_SEC,
+    CircuitBreaker,
+)
+
 """
     Http Client cLass
 """
 
+CONNECTION_LIMIT = 100
+CONNECTION_LIMIT_PER_HOST = 20
+KEEPALIVE_TIMEOUT_SEC = 60
+DNS_CACHE_TTL_SEC = 300
+
+REQUEST_TIMEOUT_SEC = 5
+MIN_REQUEST_TIMEOUT_SEC = 0.05
+
+GET_RETRIES = 2
+RETRY_BACKOFF_BASE_SEC = 0.1
+RETRY_BACKOFF_MAX_SEC = 1
+
+
+class DeadlineExceededError(asyncio.TimeoutError):
+    pass
+
 
 class HttpClient:
     __slots__ = [
-        "__session_"
+        "__session_",
+        "__request_timeout_",
+        "__failure_threshold_",
+        "__reset_timeout_",
+        "__breakers_"
     ]
 
     __session_: req.ClientSession
+    __request_timeout_: float
+    __failure_threshold_: int
+    __reset_timeout_: float
+    __breakers_: dict
 
-    def __init__(self, session: req.ClientSession) -> None:
+    def __init__(
+        self,
+        session: req.ClientSession,
+        request_timeout: float = REQUEST_TIMEOUT_SEC,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        reset_timeout: float = RESET_TIMEOUT_SEC
+    ) -> None:
         self.__session_ = session
+        self.__request_timeout_ = request_timeout
+        self.__failure_threshold_ = failure_threshold
+        self.__reset_timeout_ = reset_timeout
+        self.__breakers_ = {}
+
+    @classmethod
+    def create(
+        cls,
+        limit: int = CONNECTION_LIMIT,
+        limit_per_host: int = CONNECTION_LIMIT_PER_HOST,
+        keepalive_timeout: float = KEEPALIVE_TIMEOUT_SEC,
+        ttl_dns_cache: int = DNS_CACHE_TTL_SEC,
+        **kwargs
+    ) -> "HttpClient":
+        # must be called from a running event loop, the session is bound to it
+        connector = req.TCPConnector(
+            limit=limit,
+            limit_per_host=limit_per_host,
+            keepalive_timeout=keepalive_timeout,
+            ttl_dns_cache=ttl_dns_cache
+        )
+
+        return cls(req.ClientSession(connector=connector), **kwargs)
+
+    async def close(self) -> None:
+        await self.__session_.close()
+
+    async def __aenter__(self) -> "HttpClient":
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        await self.close()
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        host = urlsplit(url).netloc
+
+        if host not in self.__breakers_:
+            self.__breakers_[host] = CircuitBreaker(
+                host, self.__failure_threshold_, self.__reset_timeout_
+            )
+
+        return self.__breakers_[host]
+
+    async def get(
+        self,
+        url: str,
+        headers={},
+        deadline: float = None,
+        correlation_id: str = None
+    ) -> object:
+        # GETs are idempotent, so connection errors and 5xx are retried
+        attempt = 0
 
-    async def get(self, url: str, headers={}) -> object:
-        return await self.__session_.get(url, headers=headers)
+        while True:
+            try:
+                response = await self.__request_(
+                    "GET", url, deadline, correlation_id, headers=headers
+                )
+            except (req.ClientConnectionError, asyncio.TimeoutError):
+                if not self.__can_retry_(attempt, deadline):
+                    raise
+            else:
+                if response.status < 500 or \
+                        not self.__can_retry_(attempt, deadline):
+                    return response
+
+                response.release()
+
+            await asyncio.sleep(self.__backoff_(attempt))
+            attempt += 1
 
     async def patch(
-        self, url: str, 
-        body: object, 
-        headers={"Content-type": "application/json"}
+        self, url: str,
+        body: object,
+        headers={"Content-type": "application/json"},
+        deadline: float = None,
+        correlation_id: str = None
     ) -> object:
-        return await self.__session_.patch(url, data=body, headers=headers)
+        return await self.__request_(
+            "PATCH", url, deadline, correlation_id, data=body, headers=headers
+        )
+
+    async def __request_(
+        self,
+        method: str,
+        url: str,
+        deadline: float,
+        correlation_id: str,
+        **kwargs
+    ) -> object:
+        """
+            deadline is an absolute time.time() value, usually the moment the
+            caller on the other side of the queue stops waiting. The request's
+            span is logged under correlation_id.
+        """
+        # checked first, a request never sent must not take the breaker's
+        # half-open trial slot
+        timeout = self.__timeout_(deadline)
+
+        breaker = self.breaker(url)
+        breaker.before_call()
+
+        try:
+            with metrics.span(f"http_{method.lower()}", correlation_id):
+                response = await self.__session_.request(
+                    method, url, timeout=req.ClientTimeout(total=timeout), **kwargs
+                )
+        except (req.ClientConnectionError, asyncio.TimeoutError):
+            breaker.record_failure()
+            raise
+
+        if response.status >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+        return response
+
+    def __timeout_(self, deadline: float) -> float:
+        if deadline is None:
+            return self.__request_timeout_
+
+        remaining = deadline - time.time()
+
+        if remaining < MIN_REQUEST_TIMEOUT_SEC:
+            raise DeadlineExceededError("caller deadline already passed")
+
+        return min(self.__request_timeout_, remaining)
+
+    def __backoff_(self, attempt: int) -> float:
+        return min(RETRY_BACKOFF_MAX_SEC, RETRY_BACKOFF_BASE_SEC * 2 ** attempt)
+
+    def __can_retry_(self, attempt: int, deadline: float) -> bool:
+        if attempt >= GET_RETRIES:
+            return False
+
+        if deadline is None:
+            return True
+
+        next_attempt_at = time.time() + self.__backoff_(attempt)
+
+        return next_attempt_at + MIN_REQUEST_TIMEOUT_SEC < deadline
@@ -0,0 +1,191 @@
+import logging as lg
+import threading
+import time
+import uuid
+
+from utils.metrics import metrics
+
+from .sqs_client import CORRELATION_ID_ATTRIBUTE, SqsClient, read_string_attribute
+
+REPLY_QUEUE_PREFIX = "arno-replies-"
+# SQS's minimum, a reply nobody claimed within a minute never will be
+REPLY_QUEUE_RETENTION_SEC = 60
+# the owner retags its queue at most this often while it is in use, queues
+# not retagged for REPLY_QUEUE_IDLE_SEC are deleted by sweep_reply_queues
+HEARTBEAT_TAG = "heartbeat"
+REPLY_QUEUE_HEARTBEAT_SEC = 300
+REPLY_QUEUE_IDLE_SEC = 3600
+
+# the longest long-poll SQS allows
+REPLY_WAIT_TIME_SEC = 20
+REPLY_BATCH_SIZE = 10
+
+
+def is_idle_reply_queue(tags: dict, max_idle_sec: float = REPLY_QUEUE_IDLE_SEC) -> bool:
+    heartbeat = tags.get(HEARTBEAT_TAG)
+
+    return heartbeat is not None and time.time() - float(heartbeat) > max_idle_sec
+
+
+class ReplyQueue:
+    """
+        SQS queue owned by a single Lambda container. Commands name it as
+        their reply_to, so replies only ever reach the container waiting for
+        them and are never received, and handed back, by anyone else.
+
+        Threads of the container waiting at the same time take turns polling:
+        the one polling passes every other waiter its reply, and replies
+        nobody waits for anymore are deleted along with the rest.
+    """
+
+    __slots__ = [
+        "__sqs_",
+        "__url_",
+        "__condition_",
+        "__waiting_",
+        "__replies_",
+        "__polling_",
+        "__heartbeat_at_"
+    ]
+
+    __sqs_: SqsClient
+    __url_: str
+    __condition_: threading.Condition
+    __waiting_: set
+    __replies_: dict
+    __polling_: bool
+    __heartbeat_at_: float
+
+    def __init__(self, sqs: SqsClient, url: str, heartbeat_at: float = None) -> None:
+        self.__sqs_ = sqs
+        self.__url_ = url
+        self.__condition_ = threading.Condition()
+        self.__waiting_ = set()
+        self.__replies_ = {}
+        self.__polling_ = False
+        self.__heartbeat_at_ = heartbeat_at if heartbeat_at is not None \
+            else time.time()
+
+    @classmethod
+    def create(cls, sqs: SqsClient, prefix: str = REPLY_QUEUE_PREFIX) -> "ReplyQueue":
+        created_at = time.time()
+        url = sqs.create_queue(
+            f"{prefix}{uuid.uuid4().hex}",
+            attributes={"MessageRetentionPeriod": str(REPLY_QUEUE_RETENTION_SEC)},
+            tags={HEARTBEAT_TAG: str(int(created_at))}
+        )
+
+        return cls(sqs, url, created_at)
+
+    @property
+    def url(self) -> str:
+        return self.__url_
+
+    @property
+    def idle_sec(self) -> float:
+        # time since the last heartbeat, as the sweeper sees it
+        return time.time() - self.__heartbeat_at_
+
+    def register(self, correlation_id: str) -> None:
+        """
+            Claims the reply to correlation_id before the command is sent, so
+            whoever polls keeps it even if wait() has not started yet.
+        """
+        with self.__condition_:
+            self.__waiting_.add(correlation_id)
+
+    def cancel(self, correlation_id: str) -> None:
+        # drops the claim, a waiter wakes up and returns None without its reply
+        with self.__condition_:
+            self.__waiting_.discard(correlation_id)
+            self.__condition_.notify_all()
+
+    def wait(
+        self,
+        correlation_id: str,
+        timeout: float,
+        wait_time_seconds: int = REPLY_WAIT_TIME_SEC
+    ) -> dict:
+        """
+            Returns the reply message to correlation_id, registered before,
+            or None once timeout passes or the wait is cancelled. Returns
+            only once its own receive is over, which is never past timeout.
+        """
+        deadline = time.monotonic() + timeout
+        short_polled = False
+
+        try:
+            while True:
+                with self.__condition_:
+                    while True:
+                        if correlation_id in self.__replies_:
+                            return self.__replies_[correlation_id]
+
+                        remaining = deadline - time.monotonic()
+
+                        if remaining <= 0 or correlation_id not in self.__waiting_:
+                            return None
+
+                        if not self.__polling_ and not short_polled:
+                            self.__polling_ = True
+                            break
+
+                        # whoever is polling hands the reply over
+                        self.__condition_.wait(remaining)
+
+                # SQS only takes whole seconds, rounding down keeps every
+                # receive within the deadline; the last second gets a single
+                # short poll and otherwise waits on the other pollers
+                wait_seconds = min(wait_time_seconds, int(remaining))
+                short_polled = wait_seconds == 0
+                self.__poll_(wait_seconds)
+        finally:
+            with self.__condition_:
+                self.__waiting_.discard(correlation_id)
+                self.__replies_.pop(correlation_id, None)
+
+    def __poll_(self, wait_time_seconds: int) -> None:
+        self.__heartbeat_()
+        messages = []
+
+        try:
+            messages = self.__sqs_.fetch_messages(
+                sqs_url=self.__url_,
+                max_messages=REPLY_BATCH_SIZE,
+                wait_time_seconds=wait_time_seconds
+            ).get("Messages", [])
+        finally:
+            with self.__condition_:
+                self.__polling_ = False
+
+                for message in messages:
+                    correlation_id = read_string_attribute(
+                        message, CORRELATION_ID_ATTRIBUTE
+                    )
+
+                    if correlation_id in self.__waiting_:
+                        self.__replies_[correlation_id] = message
+                    else:
+                        # its caller gave up, nobody will ever claim it
+                        metrics.increment("orphan_replies_deleted")
+
+                self.__condition_.notify_all()
+
+        if messages:
+            self.__sqs_.delete_messages(
+                self.__url_, [message["ReceiptHandle"] for message in messages]
+            )
+
+    def __heartbeat_(self) -> None:
+        now = time.time()
+
+        if now - self.__heartbeat_at_ < REPLY_QUEUE_HEARTBEAT_SEC:
+            return
+
+        self.__heartbeat_at_ = now
+
+        try:
+            self.__sqs_.tag_queue(self.__url_, {HEARTBEAT_TAG: str(int(now))})
+        except Exception as ex:  # pylint: disable = broad-except
+            # the next heartbeat is due well before the queue counts as idle
+            lg.log(lg.WARNING, "exception %s caught tagging %s", ex, self.__url_)
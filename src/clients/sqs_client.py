@@ -0,0 +1,147 @@
+CORRELATION_ID_ATTRIBUTE = "CorrelationId"
+# epoch seconds after which nobody waits for the reply, readable without
+# decoding the body
+DEADLINE_ATTRIBUTE = "Deadline"
+
+MAX_BATCH_ENTRIES = 10
+
+
+def build_string_attributes(attributes: dict) -> dict:
+    return {
+        key: {"DataType": "String", "StringValue": str(value)}
+        for key, value in attributes.items()
+        if value is not None
+    }
+
+
+def read_string_attribute(message: dict, name: str) -> str:
+    return message.get("MessageAttributes", {}).get(name, {}).get("StringValue")
+
+
+class SqsClient:
+    __slots__ = [
+        "__client_"
+    ]
+
+    def __init__(self, client: object = None) -> None:
+        if client is None:
+            import boto3
+
+            client = boto3.client("sqs")
+
+        self.__client_ = client
+
+    def send_message(
+        self,
+        sqs_url: str,
+        message: str,
+        attributes: dict = None
+    ) -> dict:
+        params = {"QueueUrl": sqs_url, "MessageBody": message}
+
+        if attributes:
+            params["MessageAttributes"] = build_string_attributes(attributes)
+
+        return self.__client_.send_message(**params)
+
+    def send_messages(self, sqs_url: str, messages: list) -> list:
+        """
+            Sends (message, attributes) pairs with SendMessageBatch, at most 10
+            per call. Returns the indexes of the messages SQS did not accept.
+        """
+        failed = []
+
+        for start in range(0, len(messages), MAX_BATCH_ENTRIES):
+            entries = []
+
+            for index, (message, attributes) in enumerate(
+                messages[start:start + MAX_BATCH_ENTRIES], start
+            ):
+                entry = {"Id": str(index), "MessageBody": message}
+
+                if attributes:
+                    entry["MessageAttributes"] = build_string_attributes(attributes)
+
+                entries.append(entry)
+
+            response = self.__client_.send_message_batch(
+                QueueUrl=sqs_url,
+                Entries=entries
+            )
+
+            failed.extend(int(entry["Id"]) for entry in response.get("Failed", []))
+
+        return failed
+
+    def fetch_messages(
+        self,
+        sqs_url: str,
+        max_messages: int = 1,
+        wait_time_seconds: int = 0,
+        attribute_names: list = None
+    ) -> dict:
+        return self.__client_.receive_message(
+            QueueUrl=sqs_url,
+            MaxNumberOfMessages=max_messages,
+            WaitTimeSeconds=wait_time_seconds,
+            MessageAttributeNames=attribute_names or ["All"]
+        )
+
+    def delete_message(self, sqs_url: str, receipt_handle: str) -> dict:
+        return self.__client_.delete_message(
+            QueueUrl=sqs_url,
+            ReceiptHandle=receipt_handle
+        )
+
+    def delete_messages(self, sqs_url: str, receipt_handles: list) -> list:
+        # DeleteMessageBatch accepts at most 10 entries per call
+        return [
+            self.__client_.delete_message_batch(
+                QueueUrl=sqs_url,
+                Entries=[
+                    {"Id": str(index), "ReceiptHandle": receipt_handle}
+                    for index, receipt_handle in enumerate(
+                        receipt_handles[start:start + MAX_BATCH_ENTRIES]
+                    )
+                ]
+            )
+            for start in range(0, len(receipt_handles), MAX_BATCH_ENTRIES)
+        ]
+
+    def create_queue(
+        self,
+        name: str,
+        attributes: dict = None,
+        tags: dict = None
+    ) -> str:
+        params = {"QueueName": name}
+
+        if attributes:
+            params["Attributes"] = attributes
+
+        if tags:
+            params["tags"] = tags
+
+        return self.__client_.create_queue(**params)["QueueUrl"]
+
+    def delete_queue(self, sqs_url: str) -> dict:
+        return self.__client_.delete_queue(QueueUrl=sqs_url)
+
+    def tag_queue(self, sqs_url: str, tags: dict) -> dict:
+        return self.__client_.tag_queue(QueueUrl=sqs_url, Tags=tags)
+
+    def list_queue_tags(self, sqs_url: str) -> dict:
+        return self.__client_.list_queue_tags(QueueUrl=sqs_url).get("Tags", {})
+
+    def list_queues(self, prefix: str) -> list:
+        queue_urls = []
+        params = {"QueueNamePrefix": prefix, "MaxResults": 1000}
+
+        while True:
+            response = self.__client_.list_queues(**params)
+            queue_urls.extend(response.get("QueueUrls", []))
+
+            if "NextToken" not in response:
+                return queue_urls
+
+            params["NextToken"] = response["NextToken"]
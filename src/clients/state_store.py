@@ -0,0 +1,144 @@
+import json
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from decimal import Decimal
+
+
+class StateSnapshotStore(ABC):
+    """
+        Latest known state per fan, shared between the consumer (writer) and
+        the Lambda (reader). Implementations only need put and get; put
+        keeps whichever state was observed last, not whichever landed last.
+    """
+
+    __slots__ = []
+
+    @abstractmethod
+    def put(self, fan_id: object, state: dict, updated_at: float = None) -> bool:
+        """
+            Stores state as observed at updated_at, now by default. Returns
+            False when a state observed later is already stored.
+        """
+
+    @abstractmethod
+    def get(self, fan_id: object) -> tuple:
+        """
+            Returns (state, age in milliseconds) or None when unknown.
+        """
+
+
+class DynamoDbStateSnapshotStore(StateSnapshotStore):
+    __slots__ = [
+        "__table_"
+    ]
+
+    def __init__(self, table_name: str, resource: object = None) -> None:
+        if resource is None:
+            import boto3
+
+            resource = boto3.resource("dynamodb")
+
+        self.__table_ = resource.Table(table_name)
+
+    def put(self, fan_id: object, state: dict, updated_at: float = None) -> bool:
+        if updated_at is None:
+            updated_at = time.time()
+
+        # a number, so DynamoDB can compare it; floats only go in as Decimal
+        updated_at = Decimal(str(updated_at))
+
+        try:
+            self.__table_.put_item(
+                Item={
+                    "fan_id": str(fan_id),
+                    "state": json.dumps(state),
+                    "updated_at": updated_at
+                },
+                # items written before updated_at was a number hold a string
+                ConditionExpression="attribute_not_exists(fan_id) "
+                "OR attribute_type(updated_at, :string) "
+                "OR updated_at < :updated_at",
+                ExpressionAttributeValues={
+                    ":string": "S",
+                    ":updated_at": updated_at
+                }
+            )
+        except self.__table_.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+
+        return True
+
+    def get(self, fan_id: object) -> tuple:
+        item = self.__table_.get_item(
+            Key={"fan_id": str(fan_id)},
+            ConsistentRead=True
+        ).get("Item")
+
+        if item is None:
+            return None
+
+        return (
+            json.loads(item["state"]),
+            int((time.time() - float(item["updated_at"])) * 1000)
+        )
+
+
+class SqliteStateSnapshotStore(StateSnapshotStore):
+    """
+        File backed stand-in for local runs and tests.
+    """
+
+    __slots__ = [
+        "__path_"
+    ]
+
+    def __init__(self, path: str) -> None:
+        self.__path_ = path
+
+        self.__execute_(
+            "CREATE TABLE IF NOT EXISTS fan_state ("
+            "fan_id TEXT PRIMARY KEY, state TEXT, updated_at REAL)"
+        )
+
+    def put(self, fan_id: object, state: dict, updated_at: float = None) -> bool:
+        if updated_at is None:
+            updated_at = time.time()
+
+        connection = sqlite3.connect(self.__path_, timeout=5)
+
+        try:
+            with connection:
+                cursor = connection.execute(
+                    "INSERT INTO fan_state VALUES (?, ?, ?) "
+                    "ON CONFLICT (fan_id) DO UPDATE SET "
+                    "state = excluded.state, updated_at = excluded.updated_at "
+                    "WHERE excluded.updated_at > fan_state.updated_at",
+                    (str(fan_id), json.dumps(state), updated_at)
+                )
+
+                return cursor.rowcount > 0
+        finally:
+            connection.close()
+
+    def get(self, fan_id: object) -> tuple:
+        rows = self.__execute_(
+            "SELECT state, updated_at FROM fan_state WHERE fan_id = ?",
+            (str(fan_id),)
+        )
+
+        if len(rows) == 0:
+            return None
+
+        state, updated_at = rows[0]
+
+        return json.loads(state), int((time.time() - updated_at) * 1000)
+
+    def __execute_(self, sql: str, parameters: tuple = ()) -> list:
+        connection = sqlite3.connect(self.__path_, timeout=5)
+
+        try:
+            with connection:
+                return connection.execute(sql, parameters).fetchall()
+        finally:
+            connection.close()
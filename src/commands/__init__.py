@@ -0,0 +1,17 @@
+from .arno_command import (
+    ArnoCommand,
+    ArnoCommandDecoder,
+    ArnoCommandEncoder,
+    build_backend_body,
+    decode_arno_command,
+    expand_group_command,
+)
+
+__all__ = [
+    "ArnoCommand",
+    "ArnoCommandDecoder",
+    "ArnoCommandEncoder",
+    "build_backend_body",
+    "decode_arno_command",
+    "expand_group_command",
+]
@@ -0,0 +1,179 @@
+import json
+import uuid
+
+from utils.slot_properties import (
+    build_dict_slot_properties,
+    decode_slot_properties,
+    dumps,
+    encode_slot_properties,
+)
+
+
+class ArnoCommand:
+    __slots__ = [
+        "__fan_id_",
+        "__speed_",
+        "__rotation_direction_",
+        "__state_",
+        "__state_report_",
+        "__correlation_id_",
+        "__deadline_",
+        "__fan_ids_",
+        "__reply_to_"
+    ]
+
+    __fan_id_: int
+    __speed_: int
+    __rotation_direction_: int
+    __state_: bool
+    __state_report_: bool
+    __correlation_id_: str
+    __deadline_: float
+    __fan_ids_: list
+    __reply_to_: str
+
+    def __init__(
+        self,
+        fan_id: int = None,
+        speed: int = None,
+        rotation_direction: int = None,
+        state: bool = None,
+        state_report: bool = None,
+        correlation_id: str = None,
+        deadline: float = None,
+        fan_ids: list = None,
+        reply_to: str = None
+    ) -> None:
+        self.__fan_id_ = fan_id
+        self.__speed_ = speed
+        self.__rotation_direction_ = rotation_direction
+        self.__state_ = state
+        self.__state_report_ = state_report
+        self.__correlation_id_ = correlation_id or uuid.uuid4().hex
+        self.__deadline_ = deadline
+        self.__fan_ids_ = fan_ids
+        self.__reply_to_ = reply_to
+
+    @property
+    def fan_id(self) -> int:
+        return self.__fan_id_
+
+    @fan_id.setter
+    def fan_id(self, value: int) -> None:
+        self.__fan_id_ = value
+
+    @property
+    def speed(self) -> int:
+        return self.__speed_
+
+    @speed.setter
+    def speed(self, value: int) -> None:
+        self.__speed_ = value
+
+    @property
+    def rotation_direction(self) -> int:
+        return self.__rotation_direction_
+
+    @rotation_direction.setter
+    def rotation_direction(self, value: int) -> None:
+        self.__rotation_direction_ = value
+
+    @property
+    def state(self) -> bool:
+        return self.__state_
+
+    @state.setter
+    def state(self, value: bool) -> None:
+        self.__state_ = value
+
+    @property
+    def state_report(self) -> bool:
+        return self.__state_report_
+
+    @state_report.setter
+    def state_report(self, value: bool) -> None:
+        self.__state_report_ = value
+
+    @property
+    def correlation_id(self) -> str:
+        return self.__correlation_id_
+
+    @correlation_id.setter
+    def correlation_id(self, value: str) -> None:
+        self.__correlation_id_ = value
+
+    @property
+    def deadline(self) -> float:
+        # epoch seconds after which the caller no longer waits for the reply
+        return self.__deadline_
+
+    @deadline.setter
+    def deadline(self, value: float) -> None:
+        self.__deadline_ = value
+
+    @property
+    def fan_ids(self) -> list:
+        # set on group commands, fan_id then holds the group's endpoint id
+        return self.__fan_ids_
+
+    @fan_ids.setter
+    def fan_ids(self, value: list) -> None:
+        self.__fan_ids_ = value
+
+    @property
+    def reply_to(self) -> str:
+        # queue url of the sender's reply queue
+        return self.__reply_to_
+
+    @reply_to.setter
+    def reply_to(self, value: str) -> None:
+        self.__reply_to_ = value
+
+    def __str__(self) -> str:
+        return encode_slot_properties(self)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class ArnoCommandEncoder(json.JSONEncoder):
+    def default(self, o: object) -> dict:
+        return build_dict_slot_properties(o)
+
+
+class ArnoCommandDecoder(json.JSONDecoder):
+    def decode(self, s: str) -> ArnoCommand:
+        return decode_arno_command(s)
+
+
+def decode_arno_command(s: str) -> ArnoCommand:
+    return decode_slot_properties(ArnoCommand, s)
+
+
+QUEUE_ONLY_PROPERTIES = (
+    "state_report", "correlation_id", "deadline", "fan_ids", "reply_to"
+)
+
+
+def build_backend_body(command: ArnoCommand) -> str:
+    # routing metadata is only meaningful on the queues, not to the fan API
+    return dumps({
+        key: value for key, value in build_dict_slot_properties(command).items()
+        if key not in QUEUE_ONLY_PROPERTIES
+    })
+
+
+def expand_group_command(command: ArnoCommand) -> list:
+    # one command per fan of the group, all answering the same request
+    return [
+        ArnoCommand(
+            fan_id=fan_id,
+            speed=command.speed,
+            rotation_direction=command.rotation_direction,
+            state=command.state,
+            state_report=command.state_report,
+            correlation_id=command.correlation_id,
+            deadline=command.deadline
+        )
+        for fan_id in command.fan_ids
+    ]
@@ -0,0 +1,129 @@
+from commands import ArnoCommand
+
+COALESCE_WINDOW_SEC = 0.05
+COALESCE_MAX_MESSAGES = 50
+
+FAN_STATE_PROPERTIES = ("speed", "rotation_direction", "state")
+
+
+def merge_commands(commands: list) -> ArnoCommand:
+    # later commands win, so the fan ends up where the last request left it
+    merged = ArnoCommand(
+        fan_id=commands[-1].fan_id,
+        correlation_id=commands[-1].correlation_id,
+        fan_ids=commands[-1].fan_ids
+    )
+
+    for command in commands:
+        for property_name in FAN_STATE_PROPERTIES:
+            if (value := getattr(command, property_name)) is not None:
+                setattr(merged, property_name, value)
+
+    if all(command.state_report for command in commands):
+        merged.state_report = True
+
+    # keep going for as long as the most patient caller is waiting
+    if all(command.deadline is not None for command in commands):
+        merged.deadline = max(command.deadline for command in commands)
+
+    return merged
+
+
+def command_fan_keys(command: ArnoCommand) -> tuple:
+    # the fans a command drives, every fan of a group
+    return tuple(str(fan_id) for fan_id in command.fan_ids or [command.fan_id])
+
+
+def coalesce_runs(commands: list) -> list:
+    """
+        Groups pending commands by endpoint into runs, in order of first
+        arrival. A command for a fan ends the run of any other endpoint
+        sharing that fan, so "fan 0 speed 30, all off, fan 0 speed 70" stays
+        three runs.
+    """
+    runs = []
+    open_runs = {}
+
+    for command in commands:
+        endpoint = str(command.fan_id)
+        fan_keys = set(command_fan_keys(command))
+
+        for other_endpoint, run in list(open_runs.items()):
+            if other_endpoint != endpoint and \
+                    fan_keys.intersection(command_fan_keys(run[0])):
+                del open_runs[other_endpoint]
+
+        if endpoint in open_runs:
+            open_runs[endpoint].append(command)
+        else:
+            open_runs[endpoint] = [command]
+            runs.append(open_runs[endpoint])
+
+    return runs
+
+
+def coalesce_commands(commands: list) -> list:
+    """
+        Returns a (merged command, callers) pair per run of coalesce_runs(),
+        callers being the (correlation id, reply queue) of every original
+        request.
+    """
+    return [
+        (
+            merge_commands(run),
+            [(command.correlation_id, command.reply_to) for command in run]
+        )
+        for run in coalesce_runs(commands)
+    ]
+
+
+class CommandBacklog:
+    """
+        Commands received and not started yet, in arrival order. When the
+        turn of one comes it takes along every later command of its run, so
+        commands piling up behind a busy fan go to the backend as one.
+    """
+
+    __slots__ = [
+        "__entries_"
+    ]
+
+    __entries_: list
+
+    def __init__(self) -> None:
+        self.__entries_ = []
+
+    def __len__(self) -> int:
+        return len(self.__entries_)
+
+    def add(self, command: ArnoCommand, receipt_handle: str) -> None:
+        self.__entries_.append((command, receipt_handle))
+
+    def take(self, command: ArnoCommand) -> list:
+        """
+            Removes and returns the (command, receipt handle) entries merged
+            with command, command first; empty when an earlier command took
+            it already.
+        """
+        start = next(
+            (
+                index for index, (entry_command, _) in enumerate(self.__entries_)
+                if entry_command is command
+            ),
+            None
+        )
+
+        if start is None:
+            return []
+
+        later = self.__entries_[start:]
+        run = {
+            id(run_command)
+            for run_command in coalesce_runs([entry[0] for entry in later])[0]
+        }
+
+        self.__entries_[start:] = [
+            entry for entry in later if id(entry[0]) not in run
+        ]
+
+        return [entry for entry in later if id(entry[0]) in run]
@@ -0,0 +1,78 @@
+import logging as lg
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from utils.structured_logging import JsonFormatter, SamplingFilter
+
+LOG_FILE_PATH = "consumer.log"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_SAMPLE_RATE = 0.1
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+        Enqueues records as they are. The stock prepare() merges the args
+        into the message and renders the traceback on the calling thread,
+        then clears exc_info; here both are left to the listener's handlers.
+    """
+
+    def prepare(self, record: lg.LogRecord) -> lg.LogRecord:
+        return record
+
+
+class RootQueueListener(QueueListener):
+    """
+        QueueListener that also takes its QueueHandler off the root logger
+        on stop(), so nothing is enqueued once nobody reads the queue.
+    """
+
+    def __init__(self, queue_handler: QueueHandler, *handlers, **kwargs) -> None:
+        super().__init__(queue_handler.queue, *handlers, **kwargs)
+        self.queue_handler = queue_handler
+
+    def stop(self) -> None:
+        lg.getLogger().removeHandler(self.queue_handler)
+        super().stop()
+
+
+def start_log_pipeline(
+    file_path: str = LOG_FILE_PATH,
+    sample_rate: float = LOG_SAMPLE_RATE,
+    level: int = lg.INFO,
+    max_bytes: int = LOG_MAX_BYTES,
+    backup_count: int = LOG_BACKUP_COUNT
+) -> RootQueueListener:
+    """
+        Routes the root logger through a queue so the event loop only enqueues
+        records; formatting and disk writes happen on the listener's thread.
+        Call stop() on the returned listener to detach and flush it at
+        shutdown.
+    """
+    log_queue = queue.SimpleQueue()
+
+    # sampled-out records are dropped before their arguments are formatted
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    file_handler = RotatingFileHandler(
+        file_path,
+        maxBytes=max_bytes,
+        backupCount=backup_count,
+        encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    stdout_handler = lg.StreamHandler()
+    stdout_handler.setLevel(lg.WARNING)
+
+    root_log = lg.getLogger()
+    root_log.setLevel(level)
+    root_log.addHandler(queue_handler)
+
+    listener = RootQueueListener(
+        queue_handler, file_handler, stdout_handler, respect_handler_level=True
+    )
+    listener.start()
+
+    return listener
@@ -1,148 +1,637 @@
 import asyncio
-import json
 import logging as lg
-from datetime import datetime
-from threading import Event
-from traceback import format_exc
-
-import aiohttp as req
-
-from clients import HttpClient, SqsClient
-from commands import ArnoCommand, ArnoCommandDecoder
+import os
+import time
+from functools import lru_cache, partial
+
+from clients import (
+    CORRELATION_ID_ATTRIBUTE,
+    DEADLINE_ATTRIBUTE,
+    AsyncSqsClient,
+    DynamoDbStateSnapshotStore,
+    HttpClient,
+    REPLY_QUEUE_PREFIX,
+    SqsClient,
+    is_idle_reply_queue,
+    read_string_attribute,
+)
+from commands import ArnoCommand, build_backend_body, expand_group_command
+from consumer.coalescer import (
+    COALESCE_MAX_MESSAGES,
+    COALESCE_WINDOW_SEC,
+    CommandBacklog,
+    command_fan_keys,
+    merge_commands,
+)
+from consumer.log_pipeline import start_log_pipeline
+from consumer.reply_buffer import ReplyBuffer
+from consumer.state_cache import FanStateCache
+from consumer.worker_pool import MAX_CONCURRENCY, FanWorkerPool
 from models import ArnoResponse
+from utils.message_format import (
+    JSON_FORMAT,
+    MESSAGE_FORMAT_ATTRIBUTE,
+    decode_message,
+    encode_message,
+)
+from utils.metrics import metrics, write_metrics_file
+from utils.shard_routing import DEFAULT_SHARD, get_shard
 
-HOME_QUEUE = "XXXXXXXXXXXXXXXXXXXXXX"
+# each consumer serves one home: its queue and backend come from the routing
+# table the Lambda uses, run one consumer per shard with HOME_SHARD set
+HOME_SHARD = get_shard(os.environ.get("HOME_SHARD", DEFAULT_SHARD))
+# replies to commands from Lambdas that predate reply queues
 ALEXA_QUEUE = "XXXXXXXXXXXXXXXXXXXXXX"
-BACKEND_BASE_URL = "XXXXXXXXXXXXXXXXXXXXXX"
+STATE_SNAPSHOT_TABLE = "XXXXXXXXXXXXXXXXXXXXXX"
+
+# switch to MSGPACK_FORMAT once every Lambda version reads it
+OUTBOUND_MESSAGE_FORMAT = JSON_FORMAT
 
-MAX_ITEMS_STACK = 15
+# set to a file path to keep unsent replies across restarts
+REPLY_JOURNAL_PATH = None
+
+# how long a stopping consumer keeps sending the replies it still holds
+REPLY_FLUSH_TIMEOUT_SEC = 5
+
+# Lambda containers do not outlive their reply queues, the ones whose owner
+# is gone are found by their heartbeat tag and deleted
+REPLY_QUEUE_SWEEP_SEC = 900
+
+RECEIVE_BATCH_SIZE = 10
+RECEIVE_WAIT_TIME_SEC = 20
 
 TIME_INTERVAL_SEC = 0
 
 CUR_TIMEZONE_NAME = "XXXXXXXXXXXXXXXXXXXXXX"
 
-root_log = lg.getLogger("root")
+# rotating json log, written from a background thread; INFO records are
+# sampled per correlation id, warnings and errors are always kept
+LOG_FILE_PATH = "consumer.log"
+LOG_SAMPLE_RATE = 0.1
 
-file_logger = lg.FileHandler(
-    filename=f"log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log", encoding="utf-8"
-)
-file_logger.setLevel(lg.DEBUG)
-file_logger.setFormatter(
-    lg.Formatter(
-        "(%(asctime)s)[%(levelname)s:%(name)s] %(module)s.%(filename)s.%(funcName)s => | %(message)s |" # noqa
-    )
-)
-file_logger.addFilter(lg.Filter(name="root"))
-
-stdout_logger = lg.StreamHandler()
-stdout_logger.setLevel(lg.WARNING)
-
-root_log.setLevel(lg.DEBUG)
-root_log.addHandler(file_logger)
-root_log.addHandler(stdout_logger)
-
-response_stack = []
-
-
-def handle_response_stack(sqs_client: SqsClient, max_tries=5, interval=1) -> None:
-    while len(response_stack) > 0:
-        cur_try = 0
-        top_item = response_stack.pop(-1)
-        exit_flag = Event()
-        while cur_try < max_tries and not exit_flag.wait(interval * cur_try):
-            try:
-                post_alexa_queue_message(sqs_client, str(top_item))
-                return
-            except Exception as ex:  # pylint: disable = broad-except
-                cur_try += 1
-                lg.log(
-                    lg.ERROR,
-                    "exception %s caught when posting message to alexa queue (try %d of %d)\nstack%s", # noqa
-                    ex,
-                    cur_try + 1,
-                    max_tries,
-                    format_exc()
-                )
+# prometheus text format, for the node exporter textfile collector or similar
+METRICS_PATH = "consumer_metrics.prom"
+METRICS_PREFIX = "arno_consumer"
+METRICS_INTERVAL_SEC = 15
 
+state_cache = FanStateCache()
+command_backlog = CommandBacklog()
 
-def post_alexa_queue_message(sqs_client: SqsClient, message: str) -> None:
-    sqs_client.send_message(ALEXA_QUEUE, message)
 
+# built on first use, importing this module must not need AWS credentials
+@lru_cache(maxsize=None)
+def get_state_store() -> DynamoDbStateSnapshotStore:
+    return DynamoDbStateSnapshotStore(STATE_SNAPSHOT_TABLE)
 
-async def main() -> None:
-    while True:
+
+def put_state_snapshot(fan_id: object, state: dict, observed_at: float) -> None:
+    get_state_store().put(fan_id, state, observed_at)
+
+
+def post_alexa_queue_message(
+    reply_buffer: ReplyBuffer,
+    arno_response: ArnoResponse,
+    deadline: float = None,
+    reply_to: str = None
+) -> None:
+    message, attributes = encode_message(arno_response, OUTBOUND_MESSAGE_FORMAT)
+    attributes[CORRELATION_ID_ATTRIBUTE] = arno_response.correlation_id
+    # lets any Lambda delete the reply once its own invocation has given up
+    attributes[DEADLINE_ATTRIBUTE] = deadline
+
+    # sent in the background by ReplyBuffer.drain, never blocks the command
+    reply_buffer.push(message, attributes, deadline, reply_to)
+
+
+async def send_alexa_queue_messages(
+    sqs_client: AsyncSqsClient,
+    messages: list
+) -> list:
+    """
+        Sends each reply to the queue of the Lambda container that is waiting
+        for it and returns the indexes of the ones that failed. A queue gone
+        with its container only fails its own replies.
+    """
+    indexes_by_queue = {}
+
+    for index, (queue_url, _, _) in enumerate(messages):
+        indexes_by_queue.setdefault(queue_url or ALEXA_QUEUE, []).append(index)
+
+    correlation_ids = [
+        attributes.get(CORRELATION_ID_ATTRIBUTE) for _, _, attributes in messages
+    ]
+
+    async def send_queue_messages(queue_url: str, indexes: list) -> list:
         try:
-            sqs_client = SqsClient()
+            failed = await sqs_client.send_messages(
+                queue_url,
+                [(messages[index][1], messages[index][2]) for index in indexes]
+            )
+        except Exception as ex:  # pylint: disable = broad-except
+            lg.log(lg.ERROR, "exception %s caught sending to %s", ex, queue_url)
+            return indexes
+
+        return [indexes[queue_index] for queue_index in failed]
+
+    with metrics.span("reply_send", correlation_ids):
+        failed_by_queue = await asyncio.gather(*(
+            send_queue_messages(queue_url, indexes)
+            for queue_url, indexes in indexes_by_queue.items()
+        ))
+
+    return [index for failed in failed_by_queue for index in failed]
+
+
+def publish_state_snapshot(fan_id: object, state: dict, observed_at: float) -> None:
+    # the Lambda answers ReportState from this, replies must not wait on it
+    future = asyncio.get_running_loop().run_in_executor(
+        None, put_state_snapshot, fan_id, state, observed_at
+    )
+    future.add_done_callback(log_state_snapshot_failure)
+
+
+def log_state_snapshot_failure(future: asyncio.Future) -> None:
+    if not future.cancelled() and (ex := future.exception()) is not None:
+        lg.log(lg.ERROR, "exception %s caught publishing state snapshot", ex)
+
+
+def is_expired(deadline: float) -> bool:
+    return deadline is not None and deadline <= time.time()
+
 
-            messages = sqs_client.fetch_messages(HOME_QUEUE)
+def read_deadline(message: dict) -> float:
+    deadline = read_string_attribute(message, DEADLINE_ATTRIBUTE)
 
-            message_received = messages["Messages"][0]
+    return float(deadline) if deadline is not None else None
 
-            message_receipt_handle = message_received["ReceiptHandle"]
 
-            message_body = message_received["Body"]
+def drop_expired_command(correlation_id: str, stage: str) -> None:
+    # nobody is waiting for these, so neither the backend nor a reply is worth it
+    metrics.increment("expired_commands")
+
+    lg.log(
+        lg.INFO, "command expired before %s, dropped", stage,
+        extra={"correlation_id": correlation_id}
+    )
+
+
+async def call_backend(
+    http_client: HttpClient,
+    command: ArnoCommand
+) -> ArnoResponse:
+    if command.state_report:
+        if (cached := state_cache.get(command.fan_id)) is not None:
+            state, state_age_ms = cached
 
             lg.log(
-                lg.INFO, "message %s received with body %s",
-                message_receipt_handle,
-                message_body
+                lg.INFO, "state of fan %s served from cache (%d ms old)",
+                command.fan_id,
+                state_age_ms,
+                extra={"correlation_id": command.correlation_id}
+            )
+
+            return ArnoResponse(
+                status_code=200,
+                response_message=state,
+                success=True,
+                state_age_ms=state_age_ms
             )
 
-            sqs_client.delete_message(HOME_QUEUE, message_receipt_handle)
+        response = await http_client.get(
+            f"{HOME_SHARD.backend_base_url}/{command.fan_id}",
+            deadline=command.deadline,
+            correlation_id=command.correlation_id
+        )
+
+    else:
+        response = await http_client.patch(
+            f"{HOME_SHARD.backend_base_url}/{command.fan_id}",
+            body=build_backend_body(command),
+            deadline=command.deadline,
+            correlation_id=command.correlation_id
+        )
+
+    response.raise_for_status()
+    # puts run off the loop and may land out of order, the store keeps the
+    # state observed last
+    observed_at = time.time()
+
+    # the body is read once, the log line only formats it if it is sampled
+    response_body = await response.json()
+
+    lg.log(
+        lg.INFO,
+        "[%d] -> %s {%s}",
+        response.status,
+        response.url,
+        response_body,
+        extra={"correlation_id": command.correlation_id}
+    )
+
+    state_cache.put(command.fan_id, response_body)
+    publish_state_snapshot(command.fan_id, response_body, observed_at)
+
+    return ArnoResponse(
+        status_code=response.status,
+        response_message=response_body,
+        success=response.ok,
+        state_age_ms=0
+    )
+
 
+async def call_group_backend(
+    http_client: HttpClient,
+    command: ArnoCommand
+) -> ArnoResponse:
+    """
+        Runs the calls for every fan of a group command at once and folds them
+        into one response: the state of the first fan plus every fan's state
+        under "fans", or a failure naming the fans that did not answer.
+    """
+    fan_commands = expand_group_command(command)
+
+    fan_responses = await asyncio.gather(
+        *(call_backend(http_client, fan_command) for fan_command in fan_commands),
+        return_exceptions=True
+    )
+
+    states = {}
+    failures = {}
+
+    for fan_command, fan_response in zip(fan_commands, fan_responses):
+        if isinstance(fan_response, Exception):
+            failures[str(fan_command.fan_id)] = str(fan_response)
+        else:
+            states[str(fan_command.fan_id)] = fan_response
+
+    if failures:
+        lg.log(
+            lg.ERROR, "fans %s of group %s failed: %s",
+            ", ".join(failures),
+            command.fan_id,
+            failures,
+            extra={"correlation_id": command.correlation_id}
+        )
+
+        return ArnoResponse(
+            response_message=f"fans {', '.join(failures)} unavailable",
+            success=False
+        )
+
+    first_response = states[str(fan_commands[0].fan_id)]
+
+    return ArnoResponse(
+        status_code=first_response.status_code,
+        response_message={
+            **first_response.response_message,
+            "fans": {
+                fan_id: fan_response.response_message
+                for fan_id, fan_response in states.items()
+            }
+        },
+        success=all(fan_response.success for fan_response in states.values()),
+        state_age_ms=max(
+            fan_response.state_age_ms or 0 for fan_response in states.values()
+        )
+    )
+
+
+async def handle_command(
+    reply_buffer: ReplyBuffer,
+    http_client: HttpClient,
+    command: ArnoCommand,
+    callers: list
+) -> None:
+    # it may have waited behind other commands for the same fan
+    if is_expired(command.deadline):
+        drop_expired_command(command.correlation_id, "backend call")
+        return
+
+    lg.log(
+        lg.INFO, "calling API with %s", command,
+        extra={"correlation_id": command.correlation_id}
+    )
+
+    try:
+        with metrics.span("backend_call", command.correlation_id):
+            if command.fan_ids:
+                backend_response = await call_group_backend(http_client, command)
+            else:
+                backend_response = await call_backend(http_client, command)
+    except Exception as ex:  # pylint: disable = broad-except
+        if is_expired(command.deadline):
+            drop_expired_command(command.correlation_id, "backend reply")
+            return
+
+        # tell the callers right away instead of leaving them to time out,
+        # an open circuit ends up here without touching the backend
+        lg.log(
+            lg.ERROR,
+            "exception %s caught calling API",
+            ex,
+            extra={"correlation_id": command.correlation_id}
+        )
+
+        backend_response = ArnoResponse(
+            response_message=f"backend unavailable: {ex}",
+            success=False
+        )
+
+    # the fan state is up to date either way, only the reply is not wanted
+    if is_expired(command.deadline):
+        drop_expired_command(command.correlation_id, "reply")
+        return
+
+    # every coalesced request gets its own reply with the same final state
+    for correlation_id, reply_to in callers:
+        arno_response = ArnoResponse(
+            status_code=backend_response.status_code,
+            response_message=backend_response.response_message,
+            success=backend_response.success,
+            correlation_id=correlation_id,
+            state_age_ms=backend_response.state_age_ms
+        )
+
+        post_alexa_queue_message(
+            reply_buffer, arno_response, command.deadline, reply_to
+        )
+
+
+async def delete_messages(sqs_client: AsyncSqsClient, receipt_handles: list) -> None:
+    try:
+        await sqs_client.delete_messages(HOME_SHARD.queue_url, receipt_handles)
+    except Exception as ex:  # pylint: disable = broad-except
+        # redelivered once visible again, and dropped then as expired
+        lg.log(lg.ERROR, "exception %s caught deleting messages", ex)
+        return
+
+    lg.log(lg.INFO, "%d messages deleted", len(receipt_handles))
+
+
+async def run_command(
+    reply_buffer: ReplyBuffer,
+    http_client: HttpClient,
+    command: ArnoCommand,
+    callers: list,
+    sqs_client: AsyncSqsClient,
+    receipt_handles: list
+) -> None:
+    try:
+        await handle_command(reply_buffer, http_client, command, callers)
+    except Exception as ex:  # pylint: disable = broad-except
+        lg.log(
+            lg.ERROR,
+            "exception %s caught handling command",
+            ex,
+            exc_info=True,
+            extra={"correlation_id": command.correlation_id}
+        )
+
+    # failed and expired commands are not retried, the caller has moved on
+    await delete_messages(sqs_client, receipt_handles)
+
+
+async def run_turn(
+    reply_buffer: ReplyBuffer,
+    http_client: HttpClient,
+    sqs_client: AsyncSqsClient,
+    command: ArnoCommand
+) -> None:
+    # the later commands of its run that arrived while it waited go along
+    entries = command_backlog.take(command)
+
+    if len(entries) == 0:
+        return
+
+    commands = [entry_command for entry_command, _ in entries]
+    merged_command = merge_commands(commands)
+
+    if len(commands) > 1:
+        lg.log(
+            lg.INFO, "%d commands coalesced into %s",
+            len(commands),
+            merged_command,
+            extra={"correlation_id": merged_command.correlation_id}
+        )
+
+    await run_command(
+        reply_buffer,
+        http_client,
+        merged_command,
+        [(command.correlation_id, command.reply_to) for command in commands],
+        sqs_client,
+        [receipt_handle for _, receipt_handle in entries]
+    )
+
+
+async def receive_messages(
+    sqs_client: AsyncSqsClient,
+    coalesce_window: float
+) -> list:
+    messages = await sqs_client.fetch_messages(
+        HOME_SHARD.queue_url,
+        max_messages=RECEIVE_BATCH_SIZE,
+        wait_time_seconds=RECEIVE_WAIT_TIME_SEC
+    )
+
+    messages_received = messages.get("Messages", [])
+
+    if len(messages_received) == 0 or coalesce_window <= 0:
+        return messages_received
+
+    # give quick follow-ups ("speed 30, 50, 70") a chance to land in this batch
+    await asyncio.sleep(coalesce_window)
+
+    while len(messages_received) < COALESCE_MAX_MESSAGES:
+        messages = await sqs_client.fetch_messages(
+            HOME_SHARD.queue_url,
+            max_messages=RECEIVE_BATCH_SIZE
+        )
+
+        if len(messages.get("Messages", [])) == 0:
+            break
+
+        messages_received.extend(messages["Messages"])
+
+    return messages_received
+
+
+async def consume_messages(
+    sqs_client: AsyncSqsClient,
+    http_client: HttpClient,
+    worker_pool: FanWorkerPool,
+    reply_buffer: ReplyBuffer,
+    coalesce_window: float = COALESCE_WINDOW_SEC
+) -> None:
+    """
+        Receives one batch and hands its commands to the worker pool without
+        waiting for them, each message is deleted once its own command is
+        done. A full pool holds the next receive back, commands waiting
+        behind a busy fan are merged when its turn comes.
+    """
+    await worker_pool.wait_for_room()
+
+    started_at = time.perf_counter()
+    messages_received = await receive_messages(sqs_client, coalesce_window)
+
+    # timed by hand, the correlation ids are only known once it is done
+    metrics.observe(
+        "receive",
+        (time.perf_counter() - started_at) * 1000,
+        [
+            read_string_attribute(message_received, CORRELATION_ID_ATTRIBUTE)
+            for message_received in messages_received
+        ]
+    )
+
+    if len(messages_received) == 0:
+        return
+
+    lg.log(lg.INFO, "%d messages received", len(messages_received))
+
+    # expired and undecodable messages, deleted right away
+    dropped_receipt_handles = []
+
+    for message_received in messages_received:
+        correlation_id = read_string_attribute(
+            message_received, CORRELATION_ID_ATTRIBUTE
+        )
+
+        # a backlog of expired commands costs an attribute read each, and
+        # stale fan states never get merged into live ones
+        if is_expired(read_deadline(message_received)):
+            drop_expired_command(correlation_id, "decoding")
+            dropped_receipt_handles.append(message_received["ReceiptHandle"])
+            continue
+
+        try:
+            with metrics.span("decode", correlation_id):
+                command = decode_message(
+                    ArnoCommand,
+                    message_received["Body"],
+                    read_string_attribute(
+                        message_received, MESSAGE_FORMAT_ATTRIBUTE
+                    )
+                )
+        except Exception as ex:  # pylint: disable = broad-except
             lg.log(
-                lg.INFO, "message %s deleted",
-                message_receipt_handle
+                lg.ERROR,
+                "exception %s caught decoding message %s",
+                ex,
+                message_received["MessageId"],
+                exc_info=True
             )
+            dropped_receipt_handles.append(message_received["ReceiptHandle"])
+            continue
 
-            async with req.ClientSession() as session:
-                http_client = HttpClient(session)
+        # messages from senders that predate the attribute
+        if is_expired(command.deadline):
+            drop_expired_command(command.correlation_id, "coalescing")
+            dropped_receipt_handles.append(message_received["ReceiptHandle"])
+            continue
 
-                lg.log(lg.INFO, "calling API with %s", message_body)
+        lg.log(
+            lg.INFO, "message %s received with command %s",
+            message_received["MessageId"],
+            command,
+            extra={"correlation_id": command.correlation_id}
+        )
 
-                command: ArnoCommand = json.loads(
-                    message_body,
-                    cls=ArnoCommandDecoder
-                )
+        command_backlog.add(command, message_received["ReceiptHandle"])
 
-                response = await http_client.patch(
-                    f"{BACKEND_BASE_URL}/{command.fan_id}",
-                    body=str(command)
-                )
+        # same fan runs in arrival order, different fans overlap; a group
+        # command is ordered against the commands of each of its fans
+        worker_pool.submit_all(
+            command_fan_keys(command),
+            run_turn(reply_buffer, http_client, sqs_client, command)
+        )
 
-                response.raise_for_status()
+    if dropped_receipt_handles:
+        await delete_messages(sqs_client, dropped_receipt_handles)
 
-                lg.log(
-                    lg.INFO,
-                    "[%d] -> %s {%s}",
-                    response.status,
-                    response.url,
-                    await response.text()
-                )
 
-                response_body = await response.json()
+async def export_metrics(interval: float = METRICS_INTERVAL_SEC) -> None:
+    # histograms are cumulative, scrapers work out the rates themselves
+    while True:
+        await asyncio.sleep(interval)
 
-                arno_response = ArnoResponse(
-                    status_code=response.status,
-                    response_message=response_body,
-                    success=response.ok
-                )
+        text = metrics.render_prometheus(METRICS_PREFIX)
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, write_metrics_file, METRICS_PATH, text
+            )
+        except Exception as ex:  # pylint: disable = broad-except
+            lg.log(lg.ERROR, "exception %s caught writing metrics", ex)
+
+
+async def sweep_reply_queues(
+    sqs_client: AsyncSqsClient,
+    interval: float = REPLY_QUEUE_SWEEP_SEC
+) -> None:
+    while True:
+        try:
+            for queue_url in await sqs_client.list_queues(REPLY_QUEUE_PREFIX):
+                if is_idle_reply_queue(await sqs_client.list_queue_tags(queue_url)):
+                    await sqs_client.delete_queue(queue_url)
+                    lg.log(lg.INFO, "idle reply queue %s deleted", queue_url)
+        except Exception as ex:  # pylint: disable = broad-except
+            lg.log(lg.ERROR, "exception %s caught sweeping reply queues", ex)
 
+        await asyncio.sleep(interval)
+
+
+async def flush_replies(reply_buffer: ReplyBuffer, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+
+    while reply_buffer.pending > 0 and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+
+    if reply_buffer.pending > 0:
+        lg.log(lg.WARNING, "%d replies not sent at shutdown", reply_buffer.pending)
+
+
+async def main(
+    max_concurrency: int = MAX_CONCURRENCY,
+    sqs: SqsClient = None,
+    stop_event: object = None
+) -> None:
+    """
+        Runs until cancelled or, when given, until stop_event is set; the
+        commands in hand are then finished and their replies sent before
+        returning.
+    """
+    log_listener = start_log_pipeline(LOG_FILE_PATH, LOG_SAMPLE_RATE)
+
+    worker_pool = FanWorkerPool(max_concurrency)
+    reply_buffer = ReplyBuffer(journal_path=REPLY_JOURNAL_PATH)
+
+    # a single pooled session keeps backend connections warm between commands
+    async with AsyncSqsClient(sqs) as sqs_client, \
+            HttpClient.create() as http_client:
+        drain_task = asyncio.ensure_future(
+            reply_buffer.drain(partial(send_alexa_queue_messages, sqs_client))
+        )
+        metrics_task = asyncio.ensure_future(export_metrics())
+        sweep_task = asyncio.ensure_future(sweep_reply_queues(sqs_client))
+
+        try:
+            while stop_event is None or not stop_event.is_set():
                 try:
-                    post_alexa_queue_message(sqs_client, str(arno_response))
+                    await consume_messages(
+                        sqs_client, http_client, worker_pool, reply_buffer
+                    )
                 except Exception as ex:  # pylint: disable = broad-except
-                    if len(response_stack) > 5:
-                        response_stack.pop(0)
-                        response_stack.append(arno_response)
-                        raise ex
-                    handle_response_stack(sqs_client)
+                    lg.log(lg.ERROR, "exception %s caught", ex, exc_info=True)
 
-        except Exception as ex:  # pylint: disable = broad-except
-            lg.log(lg.ERROR, "exception %ex caught\nstack%s", ex, format_exc())
+            await worker_pool.join()
+            await flush_replies(reply_buffer, REPLY_FLUSH_TIMEOUT_SEC)
+        finally:
+            drain_task.cancel()
+            metrics_task.cancel()
+            sweep_task.cancel()
+            log_listener.stop()
 
-    # fan_id: int
-    # speed: int
-    # rotation_direction: RotationDirection
-    # state: bool
 
-asyncio.run(main())
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,281 @@
+import asyncio
+import json
+import logging as lg
+import os
+import random
+import time
+import uuid
+from collections import deque
+from typing import Awaitable, Callable
+
+from utils.metrics import metrics
+
+REPLY_BUFFER_CAPACITY = 500
+REPLY_BATCH_SIZE = 10
+
+BACKOFF_BASE_SEC = 0.2
+BACKOFF_MAX_SEC = 30
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+
+def backoff_delay(attempt: int) -> float:
+    # "equal jitter": at least half the exponential delay, at most all of it
+    delay = min(BACKOFF_MAX_SEC, BACKOFF_BASE_SEC * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class ReplyBuffer:
+    """
+        Bounded FIFO of outbound replies, drained in batches by drain(). When a
+        journal path is given every reply is appended to it until it is sent,
+        so replies pending during an outage survive a restart. Journal records
+        are written by drain() in one write per batch, off the event loop.
+        Replies still queued past their deadline are dropped, nobody is
+        waiting for them anymore.
+    """
+
+    __slots__ = [
+        "__entries_",
+        "__capacity_",
+        "__overflow_policy_",
+        "__journal_path_",
+        "__not_empty_",
+        "__dropped_",
+        "__expired_",
+        "__in_flight_",
+        "__journal_records_"
+    ]
+
+    __entries_: deque
+    __capacity_: int
+    __overflow_policy_: str
+    __journal_path_: str
+    __not_empty_: asyncio.Event
+    __dropped_: int
+    __expired_: int
+    __in_flight_: int
+    __journal_records_: list
+
+    def __init__(
+        self,
+        capacity: int = REPLY_BUFFER_CAPACITY,
+        overflow_policy: str = DROP_OLDEST,
+        journal_path: str = None
+    ) -> None:
+        if overflow_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"unknown overflow policy {overflow_policy}")
+
+        self.__entries_ = deque()
+        self.__capacity_ = capacity
+        self.__overflow_policy_ = overflow_policy
+        self.__journal_path_ = journal_path
+        self.__not_empty_ = asyncio.Event()
+        self.__dropped_ = 0
+        self.__expired_ = 0
+        self.__in_flight_ = 0
+        self.__journal_records_ = []
+
+        if journal_path is not None:
+            self.__recover_()
+
+    @property
+    def dropped(self) -> int:
+        return self.__dropped_
+
+    @property
+    def expired(self) -> int:
+        return self.__expired_
+
+    @property
+    def pending(self) -> int:
+        # queued replies plus the batch being sent right now
+        return len(self.__entries_) + self.__in_flight_
+
+    def __len__(self) -> int:
+        return len(self.__entries_)
+
+    def push(
+        self,
+        message: str,
+        attributes: dict,
+        deadline: float = None,
+        queue_url: str = None
+    ) -> bool:
+        if len(self.__entries_) >= self.__capacity_:
+            self.__dropped_ += 1
+
+            if self.__overflow_policy_ == DROP_NEWEST:
+                lg.log(lg.WARNING, "reply buffer full, newest reply dropped")
+                return False
+
+            oldest = self.__entries_.popleft()
+            self.__journal_(("ack", oldest[0]))
+            lg.log(lg.WARNING, "reply buffer full, oldest reply dropped")
+
+        entry = (uuid.uuid4().hex, message, attributes, deadline, queue_url)
+
+        self.__entries_.append(entry)
+        self.__journal_(("put",) + entry)
+        self.__not_empty_.set()
+
+        return True
+
+    async def drain(
+        self,
+        send_batch: Callable[[list], Awaitable[list]],
+        batch_size: int = REPLY_BATCH_SIZE
+    ) -> None:
+        """
+            Runs until cancelled. send_batch gets a list of (queue url,
+            message, attributes) and returns the indexes of the ones that
+            failed.
+        """
+        attempt = 0
+
+        while True:
+            await self.__not_empty_.wait()
+
+            self.__drop_expired_()
+
+            if len(self.__entries_) == 0:
+                self.__not_empty_.clear()
+                await self.__compact_journal_()
+                continue
+
+            # the puts are on disk before their replies go out
+            await self.__write_journal_()
+
+            batch = [
+                self.__entries_.popleft()
+                for _ in range(min(batch_size, len(self.__entries_)))
+            ]
+
+            self.__in_flight_ = len(batch)
+
+            try:
+                failed = set(await send_batch(
+                    [
+                        (queue_url, message, attributes)
+                        for _, message, attributes, _, queue_url in batch
+                    ]
+                ))
+            except Exception as ex:  # pylint: disable = broad-except
+                lg.log(lg.ERROR, "exception %s caught sending replies", ex)
+                failed = set(range(len(batch)))
+
+            for index, entry in enumerate(batch):
+                if index not in failed:
+                    self.__journal_(("ack", entry[0]))
+
+            # failed replies go back to the front so order is kept
+            self.__entries_.extendleft(
+                entry for index, entry in reversed(list(enumerate(batch)))
+                if index in failed
+            )
+            self.__in_flight_ = 0
+
+            if len(self.__entries_) == 0:
+                self.__not_empty_.clear()
+                await self.__compact_journal_()
+            else:
+                await self.__write_journal_()
+
+            if len(failed) == 0:
+                attempt = 0
+                continue
+
+            attempt += 1
+            delay = backoff_delay(attempt)
+
+            lg.log(
+                lg.WARNING,
+                "%d replies not sent (attempt %d), retrying in %.2fs",
+                len(failed),
+                attempt,
+                delay
+            )
+
+            await asyncio.sleep(delay)
+
+    def __drop_expired_(self) -> None:
+        now = time.time()
+        kept = deque()
+
+        for entry in self.__entries_:
+            if entry[3] is not None and entry[3] < now:
+                self.__journal_(("ack", entry[0]))
+            else:
+                kept.append(entry)
+
+        expired = len(self.__entries_) - len(kept)
+
+        if expired > 0:
+            self.__entries_ = kept
+            self.__expired_ += expired
+            metrics.increment("expired_replies_dropped", expired)
+            lg.log(lg.WARNING, "%d replies past their deadline dropped", expired)
+
+    def __journal_(self, record: tuple) -> None:
+        if self.__journal_path_ is not None:
+            self.__journal_records_.append(record)
+
+    async def __write_journal_(self) -> None:
+        if not self.__journal_records_:
+            return
+
+        lines = "".join(
+            json.dumps(record) + "\n" for record in self.__journal_records_
+        )
+        self.__journal_records_ = []
+
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.__append_journal_, lines
+        )
+
+    async def __compact_journal_(self) -> None:
+        # everything journaled so far has been acknowledged, including the
+        # records not written yet
+        if self.__journal_path_ is None:
+            return
+
+        self.__journal_records_ = []
+
+        await asyncio.get_running_loop().run_in_executor(None, self.__compact_)
+
+    def __append_journal_(self, lines: str) -> None:
+        with open(self.__journal_path_, "a", encoding="utf-8") as journal:
+            journal.write(lines)
+
+    def __compact_(self) -> None:
+        open(self.__journal_path_, "w", encoding="utf-8").close()
+
+    def __recover_(self) -> None:
+        if not os.path.exists(self.__journal_path_):
+            return
+
+        pending = {}
+
+        with open(self.__journal_path_, encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a torn last line from a crash mid-write
+                    continue
+
+                if record[0] == "put":
+                    pending[record[1]] = tuple(record[1:])
+                else:
+                    pending.pop(record[1], None)
+
+        self.__compact_()
+
+        # records written before deadlines and queue urls were journaled
+        # have neither
+        for _, message, attributes, *deadline_and_queue_url in \
+                list(pending.values())[-self.__capacity_:]:
+            self.push(message, attributes, *deadline_and_queue_url)
+
+        lg.log(lg.INFO, "%d replies recovered from journal", len(pending))
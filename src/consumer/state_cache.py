@@ -0,0 +1,62 @@
+import time
+from collections import OrderedDict
+
+STATE_CACHE_TTL_SEC = 30
+STATE_CACHE_MAX_ENTRIES = 256
+
+
+class FanStateCache:
+    """
+        Last known backend state per fan, valid for ttl seconds. The least
+        recently updated fan is evicted once max_entries is exceeded.
+    """
+
+    __slots__ = [
+        "__ttl_",
+        "__max_entries_",
+        "__entries_"
+    ]
+
+    __ttl_: float
+    __max_entries_: int
+    __entries_: OrderedDict
+
+    def __init__(
+        self,
+        ttl: float = STATE_CACHE_TTL_SEC,
+        max_entries: int = STATE_CACHE_MAX_ENTRIES
+    ) -> None:
+        self.__ttl_ = ttl
+        self.__max_entries_ = max_entries
+        self.__entries_ = OrderedDict()
+
+    def get(self, fan_id: object) -> tuple:
+        """
+            Returns (state, age in milliseconds) or None when the fan is not
+            cached or its entry has expired.
+        """
+        entry = self.__entries_.get(str(fan_id))
+
+        if entry is None:
+            return None
+
+        stored_at, state = entry
+        age = time.monotonic() - stored_at
+
+        if age > self.__ttl_:
+            self.__entries_.pop(str(fan_id), None)
+            return None
+
+        return state, int(age * 1000)
+
+    def put(self, fan_id: object, state: dict) -> None:
+        key = str(fan_id)
+
+        self.__entries_[key] = (time.monotonic(), state)
+        self.__entries_.move_to_end(key)
+
+        while len(self.__entries_) > self.__max_entries_:
+            self.__entries_.popitem(last=False)
+
+    def invalidate(self, fan_id: object) -> None:
+        self.__entries_.pop(str(fan_id), None)
@@ -0,0 +1,269 @@
+import asyncio
+import logging as lg
+import multiprocessing
+import os
+import queue
+import signal
+import time
+
+from consumer import main as consumer_main
+from consumer.log_pipeline import start_log_pipeline
+from consumer.worker_pool import MAX_CONCURRENCY
+from utils.metrics import MetricsRegistry, metrics, write_metrics_file
+from utils.shard_routing import HOME_SHARDS, get_shard
+
+# one consumer process per home shard, each with its own SQS receive, HTTP pool
+# and event loop. Workers never share a shard queue: per-fan ordering and the
+# per-process state cache both rely on a fan's commands reaching one process,
+# so a home is spread over more cores by splitting it into more shards
+SUPERVISED_SHARDS = tuple(
+    os.environ.get("CONSUMER_SHARDS", ",".join(HOME_SHARDS)).split(",")
+)
+
+SUPERVISOR_LOG_PATH = "supervisor.log"
+STATS_INTERVAL_SEC = 15
+
+# a crashing worker is restarted after RESTART_DELAY_SEC, doubled per crash
+# in a row up to RESTART_DELAY_MAX_SEC
+RESTART_DELAY_SEC = 1
+RESTART_DELAY_MAX_SEC = 60
+# a worker up for this long no longer counts as crashing in a row
+STABLE_AFTER_SEC = 60
+
+# the receive long-poll plus a batch, plus the replies flushed afterwards
+DRAIN_TIMEOUT_SEC = 40
+
+
+async def report_stats(
+    worker_id: int,
+    stats_queue: multiprocessing.Queue,
+    stop_event: object,
+    parent_pid: int
+) -> None:
+    while not stop_event.is_set():
+        await asyncio.sleep(STATS_INTERVAL_SEC)
+
+        # nobody left to stop us if the supervisor was killed outright
+        if os.getppid() != parent_pid:
+            stop_event.set()
+
+        try:
+            stats_queue.put_nowait((worker_id, metrics.snapshot()))
+        except queue.Full:
+            pass
+
+
+async def run_consumer(
+    worker_id: int,
+    stop_event: object,
+    stats_queue: multiprocessing.Queue,
+    parent_pid: int
+) -> None:
+    stats_task = asyncio.ensure_future(
+        report_stats(worker_id, stats_queue, stop_event, parent_pid)
+    )
+
+    try:
+        await consumer_main.main(MAX_CONCURRENCY, stop_event=stop_event)
+    finally:
+        stats_task.cancel()
+
+
+def run_worker(
+    worker_id: int,
+    shard_name: str,
+    stop_event: object,
+    stats_queue: multiprocessing.Queue,
+    parent_pid: int
+) -> None:
+    # stopping is the supervisor's call, it sets stop_event to drain us
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    consumer_main.HOME_SHARD = get_shard(shard_name)
+
+    # files are per worker, processes must not rotate each other's
+    consumer_main.LOG_FILE_PATH = f"{consumer_main.LOG_FILE_PATH}.{worker_id}"
+    consumer_main.METRICS_PATH = f"{consumer_main.METRICS_PATH}.{worker_id}"
+
+    if consumer_main.REPLY_JOURNAL_PATH is not None:
+        consumer_main.REPLY_JOURNAL_PATH = \
+            f"{consumer_main.REPLY_JOURNAL_PATH}.{worker_id}"
+
+    asyncio.run(run_consumer(worker_id, stop_event, stats_queue, parent_pid))
+
+
+class ConsumerSupervisor:
+    """
+        Keeps a consumer process running per shard, restarting the ones that
+        die, merges the stats they report into one metrics file and, on
+        SIGTERM/SIGINT, lets every worker finish its batch before exiting.
+    """
+
+    __slots__ = [
+        "__shards_",
+        "__context_",
+        "__stop_event_",
+        "__stats_queue_",
+        "__workers_",
+        "__started_at_",
+        "__crashes_",
+        "__restart_at_",
+        "__stats_",
+        "__stopping_"
+    ]
+
+    def __init__(self, shards: tuple = SUPERVISED_SHARDS) -> None:
+        for shard_name in shards:
+            get_shard(shard_name)
+
+        if len(set(shards)) != len(shards):
+            raise ValueError(f"shards {', '.join(shards)} listed more than once")
+
+        # spawn, so workers never inherit the supervisor's threads or locks
+        self.__context_ = multiprocessing.get_context("spawn")
+        self.__shards_ = tuple(shards)
+        self.__stop_event_ = self.__context_.Event()
+        self.__stats_queue_ = self.__context_.Queue(maxsize=len(shards) * 4)
+        self.__workers_ = {}
+        self.__started_at_ = {}
+        self.__crashes_ = {}
+        self.__restart_at_ = {}
+        self.__stats_ = {}
+        self.__stopping_ = False
+
+    def stop(self, *_) -> None:
+        # only flips a flag, the signal may arrive anywhere in run()
+        self.__stopping_ = True
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for worker_id in range(len(self.__shards_)):
+            self.__start_worker_(worker_id)
+
+        next_stats_at = time.monotonic() + STATS_INTERVAL_SEC
+
+        while not self.__stopping_:
+            self.__collect_stats_(timeout=1)
+            self.__restart_dead_workers_()
+
+            if time.monotonic() >= next_stats_at:
+                self.__write_stats_()
+                next_stats_at = time.monotonic() + STATS_INTERVAL_SEC
+
+        self.__drain_()
+
+    def __start_worker_(self, worker_id: int) -> None:
+        shard_name = self.__shards_[worker_id]
+        worker = self.__context_.Process(
+            target=run_worker,
+            args=(
+                worker_id,
+                shard_name,
+                self.__stop_event_,
+                self.__stats_queue_,
+                os.getpid()
+            ),
+            name=f"consumer-{shard_name}"
+        )
+        worker.start()
+
+        self.__workers_[worker_id] = worker
+        self.__started_at_[worker_id] = time.monotonic()
+
+        lg.log(
+            lg.INFO, "worker %d for shard %s started with pid %d",
+            worker_id,
+            shard_name,
+            worker.pid
+        )
+
+    def __restart_dead_workers_(self) -> None:
+        now = time.monotonic()
+
+        for worker_id, worker in list(self.__workers_.items()):
+            if worker.is_alive():
+                continue
+
+            if worker_id not in self.__restart_at_:
+                if now - self.__started_at_[worker_id] >= STABLE_AFTER_SEC:
+                    self.__crashes_[worker_id] = 0
+
+                crashes = self.__crashes_.get(worker_id, 0)
+                delay = min(RESTART_DELAY_MAX_SEC, RESTART_DELAY_SEC * 2 ** crashes)
+
+                self.__crashes_[worker_id] = crashes + 1
+                self.__restart_at_[worker_id] = now + delay
+
+                lg.log(
+                    lg.ERROR,
+                    "worker %d (pid %d) exited with %s, restarting in %ds",
+                    worker_id,
+                    worker.pid,
+                    worker.exitcode,
+                    delay
+                )
+
+            if now >= self.__restart_at_[worker_id]:
+                del self.__restart_at_[worker_id]
+                self.__start_worker_(worker_id)
+
+    def __collect_stats_(self, timeout: float) -> None:
+        try:
+            worker_id, snapshot = self.__stats_queue_.get(timeout=timeout)
+        except queue.Empty:
+            return
+
+        # snapshots are cumulative per worker, the latest one replaces the rest
+        self.__stats_[worker_id] = snapshot
+
+    def __write_stats_(self) -> None:
+        combined = MetricsRegistry()
+
+        for snapshot in self.__stats_.values():
+            combined.merge(snapshot)
+
+        try:
+            write_metrics_file(
+                consumer_main.METRICS_PATH,
+                combined.render_prometheus(consumer_main.METRICS_PREFIX)
+            )
+        except OSError as ex:
+            lg.log(lg.ERROR, "exception %s caught writing metrics", ex)
+
+        lg.log(
+            lg.INFO, "%d workers reporting, stages %s, counters %s",
+            len(self.__stats_),
+            combined.summary(),
+            combined.counters
+        )
+
+    def __drain_(self) -> None:
+        lg.log(lg.WARNING, "stopping, draining %d workers", len(self.__workers_))
+
+        self.__stop_event_.set()
+        deadline = time.monotonic() + DRAIN_TIMEOUT_SEC
+
+        for worker in self.__workers_.values():
+            worker.join(max(0, deadline - time.monotonic()))
+
+        for worker in self.__workers_.values():
+            if worker.is_alive():
+                lg.log(lg.ERROR, "worker pid %d did not drain, killed", worker.pid)
+                worker.terminate()
+                worker.join()
+
+
+def supervise(shards: tuple = SUPERVISED_SHARDS) -> None:
+    log_listener = start_log_pipeline(SUPERVISOR_LOG_PATH, sample_rate=1)
+
+    try:
+        ConsumerSupervisor(shards).run()
+    finally:
+        log_listener.stop()
+
+
+if __name__ == "__main__":
+    supervise()
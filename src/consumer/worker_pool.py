@@ -0,0 +1,98 @@
+import asyncio
+from typing import Awaitable, Hashable, Iterable
+
+MAX_CONCURRENCY = 10
+# submitted work not finished yet, running or waiting for its turn
+MAX_PENDING = 100
+
+
+class FanWorkerPool:
+    """
+        Runs commands concurrently, at most max_concurrency at a time, while
+        commands sharing a key (the fan id) run one after the other in the
+        order they were submitted. Work submitted under several keys (a group
+        of fans) runs after everything before it on any of them and before
+        everything after it on each of them. Producers wait_for_room() so
+        no more than max_pending pieces of work are held at once.
+    """
+
+    __slots__ = [
+        "__semaphore_",
+        "__key_tails_",
+        "__tasks_",
+        "__max_pending_",
+        "__room_"
+    ]
+
+    __semaphore_: asyncio.Semaphore
+    __key_tails_: dict
+    __tasks_: set
+    __max_pending_: int
+    __room_: asyncio.Event
+
+    def __init__(
+        self,
+        max_concurrency: int = MAX_CONCURRENCY,
+        max_pending: int = MAX_PENDING
+    ) -> None:
+        self.__semaphore_ = asyncio.Semaphore(max_concurrency)
+        self.__key_tails_ = {}
+        self.__tasks_ = set()
+        self.__max_pending_ = max_pending
+        self.__room_ = asyncio.Event()
+        self.__room_.set()
+
+    @property
+    def pending(self) -> int:
+        return len(self.__tasks_)
+
+    def submit(self, key: Hashable, work: Awaitable) -> asyncio.Task:
+        return self.submit_all((key,), work)
+
+    def submit_all(self, keys: Iterable[Hashable], work: Awaitable) -> asyncio.Task:
+        keys = tuple(keys)
+        previous = [
+            self.__key_tails_[key] for key in keys if key in self.__key_tails_
+        ]
+
+        task = asyncio.ensure_future(self.__run_(previous, work))
+
+        for key in keys:
+            self.__key_tails_[key] = task
+
+        self.__tasks_.add(task)
+        task.add_done_callback(lambda done: self.__release_(keys, done))
+
+        if len(self.__tasks_) >= self.__max_pending_:
+            self.__room_.clear()
+
+        return task
+
+    async def wait_for_room(self) -> None:
+        await self.__room_.wait()
+
+    async def join(self) -> list:
+        tasks = list(self.__tasks_)
+
+        if len(tasks) == 0:
+            return []
+
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def __run_(self, previous: list, work: Awaitable) -> object:
+        if previous:
+            # only the ordering matters here, previous failures are not ours
+            await asyncio.wait(previous)
+
+        async with self.__semaphore_:
+            return await work
+
+    def __release_(self, keys: tuple, task: asyncio.Task) -> None:
+        self.__tasks_.discard(task)
+
+        if len(self.__tasks_) < self.__max_pending_:
+            self.__room_.set()
+
+        for key in keys:
+            if self.__key_tails_.get(key) is task:
+                self.__key_tails_.pop(key)
@@ -12,116 +12,256 @@
 # See the License for the specific
 # language governing permissions and limitations under the License.
 
-import json
 import logging
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from traceback import format_exc
 
+from alexa.discovery import build_discovery_response, find_group_fan_ids
+from alexa.dispatch import DirectiveRegistry, DirectiveRoute
 from alexa.exceptions import HandleCommandException
-from alexa.models import AlexaResponse, ArnoFanDiscoveryResponse
-from clients import SqsClient
+from alexa.models import ArnoFanDiscoveryResponse
+from alexa.models.alexa_response import AlexaResponseBuilder
+from clients import (
+    CORRELATION_ID_ATTRIBUTE,
+    DEADLINE_ATTRIBUTE,
+    REPLY_QUEUE_IDLE_SEC,
+    DynamoDbStateSnapshotStore,
+    ReplyQueue,
+    SqsClient,
+    read_string_attribute,
+)
 from commands import ArnoCommand
-from models import ArnoResponse, ArnoResponseDecoder
+from models import ArnoResponse
+from utils.lambda_logging import LazyJson, configure_lambda_logger
+from utils.message_format import (
+    JSON_FORMAT,
+    MESSAGE_FORMAT_ATTRIBUTE,
+    decode_message,
+    encode_message,
+)
+from utils.metrics import emf_lines, metrics
+from utils.shard_routing import shard_for_fan
+
+# full request/response dumps are written for errors, for LOG_SAMPLE_RATE of
+# the other invocations and for every invocation when LOG_DEBUG is set
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "0.01"))
+LOG_DEBUG = os.environ.get("LOG_DEBUG", "") == "1"
+# buffered records are written once per invocation, after the response is
+# built, or as soon as a warning comes in; whatever is buffered when the
+# Lambda is killed or times out is lost, so buffering is opt-in
+LOG_BUFFERED = os.environ.get("LOG_BUFFERED", "0") == "1"
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
+log_handler = configure_lambda_logger(logger, LOG_LEVEL, LOG_BUFFERED)
 
-HOME_QUEUE = "XXXXXXXXXXXXXXXXXXXXXX"
-ALEXA_QUEUE = "XXXXXXXXXXXXXXXXXXXXXX"
+# per-span log lines are only worth their cost while debugging
+span_logger = logging.getLogger("spans")
+span_logger.setLevel(logging.INFO if LOG_DEBUG else logging.WARNING)
+span_logger.addHandler(log_handler)
+span_logger.propagate = False
+
+METRICS_NAMESPACE = "ArnoAlexaSkill"
+# EMF documents are written by the first invocation after this many seconds
+# instead of by every one; 0 publishes on every invocation
+METRICS_PUBLISH_INTERVAL_SEC = float(
+    os.environ.get("METRICS_PUBLISH_INTERVAL_SEC", "60")
+)
+
+metrics_published_at = time.monotonic()
+
+REPLY_TIMEOUT_SEC = 6
+# kept back from the invocation's remaining time to build and return a response
+RESPONSE_MARGIN_SEC = 0.5
+COMMAND_SENDERS = 16
+
+# switch to MSGPACK_FORMAT once every consumer reads it
+OUTBOUND_MESSAGE_FORMAT = JSON_FORMAT
+
+STATE_SNAPSHOT_TABLE = "XXXXXXXXXXXXXXXXXXXXXX"
+STATE_SNAPSHOT_MAX_AGE_SEC = 30
 
 supported_capabilities = ArnoFanDiscoveryResponse.supported_capabilities()
 
 
-def sqs_helper(command: ArnoCommand) -> ArnoResponse:
-    sqs = SqsClient()
+# Clients live as long as the container so warm invocations skip the boto3
+# client/session setup; they are built on first use so directives that never
+# reach AWS (Discovery, AcceptGrant) do not pay for it on a cold start.
+@lru_cache(maxsize=None)
+def get_sqs_client() -> SqsClient:
+    return SqsClient()
 
-    post_home_queue_message(sqs, command)
-    return fetch_alexa_queue_message(sqs)
 
+@lru_cache(maxsize=None)
+def get_state_store() -> DynamoDbStateSnapshotStore:
+    return DynamoDbStateSnapshotStore(STATE_SNAPSHOT_TABLE)
 
-def post_home_queue_message(sqs: SqsClient, command: ArnoCommand) -> None:
-    sqs.send_message(
-        sql_url=HOME_QUEUE,
-        message=str(command)
-    )
 
+@lru_cache(maxsize=None)
+def get_command_senders() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=COMMAND_SENDERS, thread_name_prefix="send")
 
-def fetch_alexa_queue_message(sqs: SqsClient) -> ArnoResponse:
-    messages = sqs.fetch_messages(sqs_url=ALEXA_QUEUE)
-    message_received = messages["Messages"][0]
-    message_receipt_handler = message_received["ReceiptHandle"]
 
-    sqs.delete_message(sqs_url=ALEXA_QUEUE,
-                       receipt_handle=message_receipt_handler)
+reply_queue = None
+reply_queue_lock = threading.Lock()
 
-    message_body = message_received["Body"]
 
-    return json.loads(
-        message_body,
-        cls=ArnoResponseDecoder
-    )
+def get_reply_queue() -> ReplyQueue:
+    """
+        The container's own reply queue, created by the first command. A
+        container frozen for long enough that the consumer may have swept its
+        queue as idle starts over with a new one.
+    """
+    global reply_queue
 
+    with reply_queue_lock:
+        if reply_queue is None or reply_queue.idle_sec > REPLY_QUEUE_IDLE_SEC / 2:
+            reply_queue = ReplyQueue.create(get_sqs_client())
 
-def handle_command(namespace: str, name: str, request: dict) -> AlexaResponse:
-    endpoint_id = request['directive']['endpoint']['endpointId']
-    correlation_token = request['directive']['header']['correlationToken']
-    power_state_value = None
+        return reply_queue
+
+
+# per thread, so concurrent invocations in a local harness keep their own
+invocation = threading.local()
+
+
+def start_invocation(context: object) -> None:
+    timeout = REPLY_TIMEOUT_SEC
+
+    if hasattr(context, "get_remaining_time_in_millis"):
+        timeout = min(
+            timeout,
+            context.get_remaining_time_in_millis() / 1000 - RESPONSE_MARGIN_SEC
+        )
 
-    alexa_response = AlexaResponse()
+    invocation.deadline = time.time() + timeout
+    # set once the directive turns into a command, see sqs_helper
+    invocation.correlation_id = None
+
+
+def reply_deadline() -> float:
+    deadline = getattr(invocation, "deadline", None)
+
+    return deadline if deadline is not None else time.time() + REPLY_TIMEOUT_SEC
+
+
+def sqs_helper(command: ArnoCommand) -> ArnoResponse:
+    sqs = get_sqs_client()
+    invocation.correlation_id = command.correlation_id
+
+    # the consumer bounds its backend call by how long we keep waiting
+    command.deadline = reply_deadline()
+    timeout = command.deadline - time.time()
+
+    if timeout <= 0:
+        return ArnoResponse(
+            response_message="no time left to wait for a reply",
+            correlation_id=command.correlation_id
+        )
+
+    replies = get_reply_queue()
+    command.reply_to = replies.url
+    # claimed before the command is out, whoever polls keeps the reply for us
+    replies.register(command.correlation_id)
+
+    def cancel_unsent(sent: Future) -> None:
+        if sent.exception() is not None:
+            replies.cancel(command.correlation_id)
+
+    # the reply long-poll starts while the command is still being sent; it
+    # runs on this thread, so no receive of the invocation outlives it
+    sent = get_command_senders().submit(post_home_queue_message, sqs, command)
+    sent.add_done_callback(cancel_unsent)
 
     try:
-        if namespace == "Alexa.PowerController":
-            # The directive to TurnOff or TurnOn the light bulb.
-            power_state_value = 'OFF' if name == 'TurnOff' else 'ON'
-
-            alexa_response = handle_power_command(
-                namespace=namespace,
-                name=supported_capabilities[namespace]["supported"][0]["name"],
-                endpoint_id=endpoint_id,
-                correlation_token=correlation_token,
-                power_state_value=power_state_value
-            )
+        response = fetch_reply_message(
+            replies, command.correlation_id, command.deadline - time.time()
+        )
+    finally:
+        replies.cancel(command.correlation_id)
 
-        elif namespace == "Alexa.ToggleController":
-            instance = request["directive"]["header"].get(
-                "instance", 
-                supported_capabilities[namespace].get("instance")
-            )
-            toggle_state_value = 'OFF' if name == 'TurnOff' else 'ON'
-
-            if instance == "Fan.Oscillate":
-                alexa_response = handle_toggle_command(
-                    namespace=namespace,
-                    name=supported_capabilities[namespace]["supported"][0]["name"],
-                    instance=instance,
-                    endpoint_id=endpoint_id,
-                    correlation_token=correlation_token,
-                    toggle_state_value=toggle_state_value
-                )
-
-        elif namespace == "Alexa.PercentageController" and name == "SetPercentage":
-            percentage_value = request["directive"]["payload"]["percentage"]
-
-            alexa_response = handle_percentage_command(
-                namespace=namespace,
-                name=supported_capabilities[namespace]["supported"][0]["name"],
-                endpoint_id=endpoint_id,
-                correlation_token=correlation_token,
-                percentage_value=percentage_value
-            )
+    # a command that never went out fails the directive as it always has
+    if sent.done():
+        sent.result()
 
-    except HandleCommandException as ex:  # pylint: disable = bare-except
-        alexa_response = AlexaResponse(
-            name="ErrorResponse",
-            payload={
-                "type": "ENDPOINT_UNREACHABLE",
-                "message": f"[{namespace}.{name}] -> {ex.message}"
-            }
+    return response
+
+
+def build_endpoint_command(endpoint_id: str) -> ArnoCommand:
+    command = ArnoCommand(fan_id=endpoint_id)
+
+    # a group is driven by one message, the consumer fans it out
+    if (fan_ids := find_group_fan_ids(endpoint_id)) is not None:
+        command.fan_ids = list(fan_ids)
+
+    return command
+
+
+def post_home_queue_message(sqs: SqsClient, command: ArnoCommand) -> None:
+    with metrics.span("post_home_queue_message", command.correlation_id):
+        message, attributes = encode_message(command, OUTBOUND_MESSAGE_FORMAT)
+        attributes[CORRELATION_ID_ATTRIBUTE] = command.correlation_id
+        attributes[DEADLINE_ATTRIBUTE] = command.deadline
+
+        sqs.send_message(
+            sqs_url=shard_for_fan(
+                command.fan_ids[0] if command.fan_ids else command.fan_id
+            ).queue_url,
+            message=message,
+            attributes=attributes
         )
 
-    except Exception as ex:
-        raise ex
 
-    return alexa_response
+def fetch_reply_message(
+    replies: ReplyQueue,
+    correlation_id: str,
+    timeout: float = REPLY_TIMEOUT_SEC
+) -> ArnoResponse:
+    with metrics.span("fetch_reply_message", correlation_id):
+        message = replies.wait(correlation_id, timeout)
+
+    if message is None:
+        return ArnoResponse(
+            response_message=f"no reply for command {correlation_id} "
+            f"after {timeout:.1f}s",
+            correlation_id=correlation_id
+        )
+
+    # the consumer may reply in either format while a rollout is underway
+    return decode_message(
+        ArnoResponse,
+        message["Body"],
+        read_string_attribute(message, MESSAGE_FORMAT_ATTRIBUTE)
+    )
+
+
+def read_state_snapshot(endpoint_id: str) -> ArnoResponse:
+    try:
+        snapshot = get_state_store().get(endpoint_id)
+    except Exception:  # pylint: disable = broad-exception-caught
+        logger.exception("state snapshot lookup failed for %s", endpoint_id)
+        return None
+
+    if snapshot is None:
+        return None
+
+    state, state_age_ms = snapshot
+
+    if state_age_ms > STATE_SNAPSHOT_MAX_AGE_SEC * 1000:
+        return None
+
+    return ArnoResponse(
+        status_code=200,
+        response_message=state,
+        success=True,
+        state_age_ms=state_age_ms
+    )
 
 
 def handle_power_command(
@@ -130,16 +270,18 @@ def handle_power_command(
     endpoint_id: int,
     power_state_value: str,
     correlation_token: str
-) -> AlexaResponse:
-    command = ArnoCommand()
+) -> AlexaResponseBuilder:
+    command = build_endpoint_command(endpoint_id)
+
+    if command.fan_ids is None:
+        command.fan_id = int(endpoint_id)
 
-    command.fan_id = int(endpoint_id)
     command.state = power_state_value == "ON"
 
     response = sqs_helper(command=command)
 
     if response.success:
-        alexa_response = AlexaResponse(
+        alexa_response = AlexaResponseBuilder(
             correlation_token=correlation_token,
             endpoint_id=endpoint_id,
         )
@@ -162,17 +304,16 @@ def handle_percentage_command(
     endpoint_id: str,
     percentage_value: int,
     correlation_token: str
-) -> AlexaResponse:
-    command = ArnoCommand()
+) -> AlexaResponseBuilder:
+    command = build_endpoint_command(endpoint_id)
 
-    command.fan_id = endpoint_id
     command.speed = percentage_value
     command.state = True if percentage_value > 0 else False
 
     response = sqs_helper(command=command)
 
     if response.success:
-        alexa_response = AlexaResponse(
+        alexa_response = AlexaResponseBuilder(
             correlation_token=correlation_token,
             endpoint_id=endpoint_id
         )
@@ -195,17 +336,16 @@ def handle_toggle_command(
         endpoint_id: str,
         toggle_state_value: str,
         correlation_token: str
-) -> AlexaResponse:
-    command = ArnoCommand()
+) -> AlexaResponseBuilder:
+    command = build_endpoint_command(endpoint_id)
 
-    command.fan_id = endpoint_id
     command.rotation_direction = 1 if toggle_state_value == "ON" else 0
     command.state = True
 
     response = sqs_helper(command=command)
 
     if response.success:
-        alexa_response = AlexaResponse(
+        alexa_response = AlexaResponseBuilder(
             correlation_token=correlation_token,
             endpoint_id=endpoint_id
         )
@@ -222,158 +362,271 @@ def handle_toggle_command(
     raise HandleCommandException(message=response.response_message)
 
 
+directives = DirectiveRegistry(supported_capabilities)
+
+# (property name, instance) reported for each capability in a StateReport
+reported_properties = {
+    namespace: (
+        supported_capabilities[namespace]["supported"][0]["name"],
+        supported_capabilities[namespace].get("instance")
+    )
+    for namespace in (
+        "Alexa.PowerController",
+        "Alexa.PercentageController",
+        "Alexa.ToggleController"
+    )
+}
+
+
+@directives.register("Alexa.Authorization", ("AcceptGrant",))
+def accept_grant_directive(route: DirectiveRoute, request: dict) -> dict:
+    # Note: This example code accepts any grant request.
+    # In your implementation,
+    # invoke Login With Amazon with the grant
+    # code to get access and refresh tokens.
+    request['directive']['payload']['grant']['code']
+    request['directive']['payload']['grantee']['token']
+
+    return AlexaResponseBuilder(
+        namespace='Alexa.Authorization',
+        name='AcceptGrant.Response'
+    ).get()
+
+
+@directives.register("Alexa.Discovery", ("Discover",))
+def discover_directive(route: DirectiveRoute, request: dict) -> dict:
+    return build_discovery_response()
+
+
+@directives.register("Alexa", ("ReportState",))
+def report_state_directive(route: DirectiveRoute, request: dict) -> dict:
+    endpoint_id = request['directive']['endpoint']['endpointId']
+    correlation_token = request['directive']['header']['correlationToken']
+
+    # the consumer publishes every fan state it sees, only ask it
+    # directly when that snapshot is missing or too old; snapshots are per
+    # fan, so groups always ask
+    response = None
+
+    if find_group_fan_ids(endpoint_id) is None:
+        response = read_state_snapshot(endpoint_id)
+
+    if response is None:
+        command = build_endpoint_command(endpoint_id)
+
+        command.state_report = True
+
+        response = sqs_helper(command=command)
+
+    if not response.success:
+        return AlexaResponseBuilder(
+            name="ErrorResponse",
+            payload={
+                "type": "ENDPOINT_UNREACHABLE",
+                "message": response.response_message
+            }
+        ).get()
+
+    alexa_response = AlexaResponseBuilder(
+        correlation_token=correlation_token,
+        endpoint_id=endpoint_id,
+        name="StateReport"
+    )
+
+    capability_to_value_map = {
+        "Alexa.PowerController": "ON" if response.response_message["state"] else "OFF", # noqa
+        "Alexa.PercentageController": response.response_message["speed"],
+        "Alexa.ToggleController": "ON" \
+            if response.response_message["rotation_direction"] \
+                else "OFF",
+    }
+
+    # a state served from the consumer's cache is only as exact as its age
+    uncertainty_in_milliseconds = response.state_age_ms or 0
+
+    for key, value in capability_to_value_map.items():
+        property_name, instance = reported_properties[key]
+
+        alexa_response.add_context_property(
+            namespace=key,
+            name=property_name,
+            value=value,
+            instance=instance,
+            uncertainty_in_milliseconds=uncertainty_in_milliseconds
+        )
+
+    return alexa_response.get()
+
+
+@directives.register("Alexa.PowerController", ("TurnOn", "TurnOff"))
+def power_directive(route: DirectiveRoute, request: dict) -> dict:
+    return handle_power_command(
+        namespace=route.namespace,
+        name=route.property_name,
+        endpoint_id=request['directive']['endpoint']['endpointId'],
+        correlation_token=request['directive']['header']['correlationToken'],
+        power_state_value='OFF' if route.name == 'TurnOff' else 'ON'
+    ).get()
+
+
+@directives.register(
+    "Alexa.ToggleController",
+    ("TurnOn", "TurnOff"),
+    instance="Fan.Oscillate"
+)
+def toggle_directive(route: DirectiveRoute, request: dict) -> dict:
+    return handle_toggle_command(
+        namespace=route.namespace,
+        name=route.property_name,
+        instance=route.instance,
+        endpoint_id=request['directive']['endpoint']['endpointId'],
+        correlation_token=request['directive']['header']['correlationToken'],
+        toggle_state_value='OFF' if route.name == 'TurnOff' else 'ON'
+    ).get()
+
+
+@directives.register("Alexa.PercentageController", ("SetPercentage",))
+def percentage_directive(route: DirectiveRoute, request: dict) -> dict:
+    return handle_percentage_command(
+        namespace=route.namespace,
+        name=route.property_name,
+        endpoint_id=request['directive']['endpoint']['endpointId'],
+        correlation_token=request['directive']['header']['correlationToken'],
+        percentage_value=request["directive"]["payload"]["percentage"]
+    ).get()
+
+
+def handle_command(route: DirectiveRoute, request: dict) -> dict:
+    try:
+        return route.handler(route, request)
+
+    except HandleCommandException as ex:
+        return AlexaResponseBuilder(
+            name="ErrorResponse",
+            payload={
+                "type": "ENDPOINT_UNREACHABLE",
+                "message": f"[{route.namespace}.{route.name}] -> {ex.message}"
+            }
+        ).get()
+
+
 def lambda_handler(request, context):
     try:
-        # Dump the request for logging - check the CloudWatch logs.
-        print('lambda_handler request  -----')
-        print(json.dumps(request))
+        start_invocation(context)
+
+        started_at = time.perf_counter()
+        response = handle_request(request)
+
+        # timed by hand, the command and its correlation id only exist once
+        # the directive has been handled
+        metrics.observe(
+            "lambda_handler",
+            (time.perf_counter() - started_at) * 1000,
+            getattr(invocation, "correlation_id", None)
+        )
+
+        log_invocation(request, context, response)
 
-        if context is not None:
-            print('lambda_handler context  -----')
-            print(context)
+        return response
+    finally:
+        log_handler.flush()
+        publish_metrics()
 
+
+def handle_request(request: dict) -> dict:
+    try:
         # Validate the request is an Alexa smart home directive.
         if 'directive' not in request:
-            alexa_response = AlexaResponse(
+            alexa_response = AlexaResponseBuilder(
                 name='ErrorResponse',
                 payload={
                     'type': 'INVALID_DIRECTIVE',
                     'message': 'Missing key: directive, Is the request a valid Alexa Directive?' # noqa
                 }
             )
-            return send_response(alexa_response.get())
+            return alexa_response.get()
 
         # Check the payload version.
         payload_version = request['directive']['header']['payloadVersion']
         if payload_version != '3':
-            alexa_response = AlexaResponse(
+            alexa_response = AlexaResponseBuilder(
                 name='ErrorResponse',
                 payload={
                     'type': 'INTERNAL_ERROR',
                     'message': 'This skill only supports Smart Home API version 3'
                 }
             ) 
-            return send_response(alexa_response.get())
-
-        # Crack open the request to see the request.
-        name = request['directive']['header']['name']
-        namespace = request['directive']['header']['namespace']
-
-        # Handle the incoming request from Alexa based on the namespace.
-        if namespace == 'Alexa.Authorization':
-            if name == 'AcceptGrant':
-                # Note: This example code accepts any grant request.
-                # In your implementation,
-                # invoke Login With Amazon with the grant 
-                # code to get access and refresh tokens.
-                request['directive']['payload']['grant']['code']
-                request['directive']['payload']['grantee']['token']
-
-                auth_response = AlexaResponse(
-                    namespace='Alexa.Authorization', 
-                    name='AcceptGrant.Response'
-                )
-                
-                return send_response(auth_response.get())
-
-        if namespace == 'Alexa.Discovery' and name == 'Discover':
-            fan_1 = ArnoFanDiscoveryResponse(
-                friendly_name="Ventilador 0", 
-                endpoint_id=0
-            )
-            fan_4 = ArnoFanDiscoveryResponse(
-                friendly_name="Ventilador 4", 
-                endpoint_id=4
-            )
+            return alexa_response.get()
 
-            return send_response((fan_1 + fan_4).get())
-        
-        if namespace == "Alexa" and name == "ReportState":
-            endpoint_id = request['directive']['endpoint']['endpointId']
-            correlation_token = request['directive']['header']['correlationToken']
+        # Handle the incoming request from Alexa based on the namespace,
+        # name and instance of the directive.
+        route = directives.resolve(request['directive']['header'])
 
-            command = ArnoCommand()
+        if route is not None:
+            return handle_command(route, request)
 
-            command.state_report = True
-            command.fan_id = endpoint_id
+        return AlexaResponseBuilder(
+            name="ErrorResponse",
+            payload={
+                "type": "INVALID_DIRECTIVE",
+                "message": "COMMAND INVALID"
+            }
+        ).get()
+    
+    except Exception as ex:  # pylint: disable = broad-exception-caught
+        return AlexaResponseBuilder(
+            name="ErrorResponse",
+            payload={
+                "type": "INTERNAL_ERROR",
+                "message": f"COMMAND INVALID => {ex}\nStack:{format_exc()}"
+            }
+        ).get()
 
-            response = sqs_helper(command=command)
 
-            if response.success:
+def publish_metrics() -> None:
+    # EMF documents are picked up from the log stream by CloudWatch; they
+    # cover every invocation since the last publish, then the histograms
+    # start over
+    global metrics_published_at
 
-                alexa_response = AlexaResponse(
-                    correlation_token=correlation_token,
-                    endpoint_id=endpoint_id,
-                    name="StateReport"
-                )
+    now = time.monotonic()
 
-                capability_to_value_map = {
-                    "Alexa.PowerController": "ON" if response.response_message["state"] else "OFF", # noqa
-                    "Alexa.PercentageController": response.response_message["speed"],
-                    "Alexa.ToggleController": "ON" \
-                        if response.response_message["rotation_direction"] \
-                            else "OFF",
-                }
+    if now - metrics_published_at < METRICS_PUBLISH_INTERVAL_SEC:
+        return
 
-                for key, value in capability_to_value_map.items():
-                    if(supported_capabilities[key].get("instance")):
-                        alexa_response.add_context_property(
-                            namespace=key,
-                            name=supported_capabilities[key]["supported"][0]["name"],
-                            value=value,
-                            instance=supported_capabilities[key].get("instance")
-                        )
-
-                        continue
-                    alexa_response.add_context_property(
-                        namespace=key,
-                        name=supported_capabilities[key]["supported"][0]["name"],
-                        value=value
-                    )
-
-                return send_response(alexa_response.get())
-
-            return send_response(AlexaResponse(
-                    name="ErrorResponse",
-                    payload={
-                        "type": "ENDPOINT_UNREACHABLE",
-                        "message": response.response_message
-                    }).get()
-            )
+    metrics_published_at = now
 
-        if supported_capabilities.get(namespace, None):
-            return send_response(
-                handle_command(
-                    namespace=namespace,
-                    name=name,
-                    request=request
-                ).get()
-            )
+    sys.stdout.write(emf_lines(metrics, METRICS_NAMESPACE))
+    sys.stdout.flush()
+    metrics.reset()
 
-        return send_response(AlexaResponse(
-                name="ErrorResponse",
-                payload={
-                    "type": "INVALID_DIRECTIVE",
-                    "message": "COMMAND INVALID"
-                }
-            ).get()
-        )
-    
-    except Exception as ex:  # pylint: disable = broad-exception-caught
-        return send_response(AlexaResponse(
-                name="ErrorResponse",
-                payload={
-                    "type": "INTERNAL_ERROR",
-                    "message": f"COMMAND INVALID => {ex}\nStack:{format_exc()}"
-                }
-            ).get()
-        )
 
+def is_error_response(response: dict) -> bool:
+    return response.get("event", {}).get("header", {}).get("name") == \
+        "ErrorResponse"
 
-def send_response(response):
-    print('lambda_handler response -----')
-    print(json.dumps(response))
-    return response
+
+def log_invocation(request: dict, context: object, response: dict) -> None:
+    header = request.get("directive", {}).get("header", {})
+    request_id = getattr(context, "aws_request_id", None)
+
+    # full dumps cost real billed time on Discovery, so only errors, debug
+    # and a sample of invocations pay for them
+    if is_error_response(response):
+        level = logging.WARNING
+    elif LOG_DEBUG or random.random() < LOG_SAMPLE_RATE:
+        level = logging.INFO
+    else:
+        logger.info(
+            "%s %s.%s answered",
+            request_id,
+            header.get("namespace"),
+            header.get("name")
+        )
+        return
+
+    logger.log(level, "%s request %s", request_id, LazyJson(request))
+    logger.log(level, "%s response %s", request_id, LazyJson(response))
 
 
 if __name__ == "__main__":
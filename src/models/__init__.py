@@ -0,0 +1,13 @@
+from .arno_response import (
+    ArnoResponse,
+    ArnoResponseDecoder,
+    ArnoResponseEncoder,
+    decode_arno_response,
+)
+
+__all__ = [
+    "ArnoResponse",
+    "ArnoResponseDecoder",
+    "ArnoResponseEncoder",
+    "decode_arno_response",
+]
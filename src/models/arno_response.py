@@ -1,28 +1,40 @@
 import json
 
-from utils import build_dict_public_properties
+from utils.slot_properties import (
+    build_dict_slot_properties,
+    decode_slot_properties,
+    encode_slot_properties,
+)
 
 
 class ArnoResponse:
     __slots__ = [
         "__status_code_",
         "__response_message_",
-        "__success_"
+        "__success_",
+        "__correlation_id_",
+        "__state_age_ms_"
     ]
 
     __status_code_: int
     __response_message_: dict
     __success_: bool
+    __correlation_id_: str
+    __state_age_ms_: int
 
     def __init__(
         self, 
         status_code: int = -1, 
         response_message: dict = {}, 
-        success: bool = False
+        success: bool = False,
+        correlation_id: str = None,
+        state_age_ms: int = None
     ) -> None:
         self.__status_code_ = status_code
         self.__success_ = success
         self.__response_message_ = response_message
+        self.__correlation_id_ = correlation_id
+        self.__state_age_ms_ = state_age_ms
 
     @property
     def status_code(self) -> int:
@@ -48,8 +60,24 @@ class ArnoResponse:
     def success(self, value: bool) -> None:
         self.__success_ = value
 
+    @property
+    def correlation_id(self) -> str:
+        return self.__correlation_id_
+
+    @correlation_id.setter
+    def correlation_id(self, value: str) -> None:
+        self.__correlation_id_ = value
+
+    @property
+    def state_age_ms(self) -> int:
+        return self.__state_age_ms_
+
+    @state_age_ms.setter
+    def state_age_ms(self, value: int) -> None:
+        self.__state_age_ms_ = value
+
     def __str__(self) -> str:
-        return json.dumps(self, cls=ArnoResponseEncoder)
+        return encode_slot_properties(self)
 
     def __repr__(self) -> str:
         return self.__str__()
@@ -57,16 +85,13 @@ class ArnoResponse:
 
 class ArnoResponseEncoder(json.JSONEncoder):
     def default(self, o: object) -> dict:
-        return build_dict_public_properties(o)
+        return build_dict_slot_properties(o)
 
 
 class ArnoResponseDecoder(json.JSONDecoder):
     def decode(self, s: str) -> ArnoResponse:
-        obj = ArnoResponse()
-        obj_dict = json.loads(s)
+        return decode_arno_response(s)
 
-        for key, value in obj_dict.items():
-            if key in dir(obj):
-                setattr(obj, key, value)
 
-        return obj
+def decode_arno_response(s: str) -> ArnoResponse:
+    return decode_slot_properties(ArnoResponse, s)
@@ -0,0 +1,5 @@
+from .timestamps import get_utc_timestamp
+
+__all__ = [
+    "get_utc_timestamp",
+]
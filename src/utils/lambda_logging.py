@@ -0,0 +1,82 @@
+import json
+import logging
+import sys
+
+BUFFER_CAPACITY = 1000
+
+
+class LazyJson:
+    """
+        Defers json.dumps until a log record using it is actually emitted.
+    """
+
+    __slots__ = ["__obj_"]
+
+    def __init__(self, obj: object) -> None:
+        self.__obj_ = obj
+
+    def __str__(self) -> str:
+        return json.dumps(self.__obj_, default=str)
+
+
+class BufferedStdoutHandler(logging.Handler):
+    """
+        Keeps formatted records in memory and writes them to stdout with a
+        single write on flush(), which the handler calls once the invocation
+        has its response. A record at flush_level or above is written right
+        away along with everything buffered before it.
+    """
+
+    def __init__(
+        self,
+        capacity: int = BUFFER_CAPACITY,
+        flush_level: int = logging.WARNING
+    ) -> None:
+        super().__init__()
+        self.capacity = capacity
+        self.flush_level = flush_level
+        self.lines = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.lines.append(self.format(record))
+        except Exception:  # pylint: disable = broad-except
+            self.handleError(record)
+            return
+
+        if len(self.lines) >= self.capacity or record.levelno >= self.flush_level:
+            self.flush()
+
+    def flush(self) -> None:
+        self.acquire()
+
+        try:
+            if self.lines:
+                sys.stdout.write("\n".join(self.lines) + "\n")
+                sys.stdout.flush()
+                self.lines = []
+        finally:
+            self.release()
+
+
+def configure_lambda_logger(
+    logger: logging.Logger,
+    level: str,
+    buffered: bool
+) -> logging.Handler:
+    """
+        Gives logger a handler of its own (buffered or not) so records do not
+        also go through the handler the Lambda runtime puts on the root logger.
+    """
+    handler = BufferedStdoutHandler() if buffered else logging.StreamHandler(
+        sys.stdout
+    )
+    handler.setFormatter(
+        logging.Formatter("[%(levelname)s] %(funcName)s => %(message)s")
+    )
+
+    logger.setLevel(level)
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    return handler
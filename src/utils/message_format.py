@@ -0,0 +1,66 @@
+import base64
+
+from utils.slot_properties import (
+    decode_slot_properties,
+    encode_slot_properties,
+    slot_properties,
+)
+
+try:
+    import msgpack
+except ImportError:  # optional, only needed once the compact format is enabled
+    msgpack = None
+
+MESSAGE_FORMAT_ATTRIBUTE = "MessageFormat"
+
+JSON_FORMAT = "json"
+# slot values in declaration order, msgpack packed and base64 encoded since
+# SQS bodies are text; fields may only ever be appended to the slots
+MSGPACK_FORMAT = "msgpack-v1"
+
+
+def encode_msgpack(obj: object) -> str:
+    values = [getattr(obj, name) for name in slot_properties(type(obj))]
+
+    return base64.b64encode(msgpack.packb(values)).decode("ascii")
+
+
+def decode_msgpack(cls: type, s: str) -> object:
+    values = msgpack.unpackb(base64.b64decode(s))
+
+    return cls(**{
+        name: value for name, value in zip(slot_properties(cls), values)
+        if value is not None
+    })
+
+
+MESSAGE_FORMATS = {
+    JSON_FORMAT: (encode_slot_properties, decode_slot_properties),
+}
+
+if msgpack is not None:
+    MESSAGE_FORMATS[MSGPACK_FORMAT] = (encode_msgpack, decode_msgpack)
+
+
+def encode_message(obj: object, message_format: str = JSON_FORMAT) -> tuple:
+    """
+        Returns (body, message attributes) for obj in the requested format.
+    """
+    if message_format not in MESSAGE_FORMATS:
+        raise ValueError(f"message format {message_format} is not available")
+
+    encode, _ = MESSAGE_FORMATS[message_format]
+
+    return encode(obj), {MESSAGE_FORMAT_ATTRIBUTE: message_format}
+
+
+def decode_message(cls: type, body: str, message_format: str = None) -> object:
+    # messages without the attribute predate it and are always json
+    message_format = message_format or JSON_FORMAT
+
+    if message_format not in MESSAGE_FORMATS:
+        raise ValueError(f"message format {message_format} is not available")
+
+    _, decode = MESSAGE_FORMATS[message_format]
+
+    return decode(cls, body)
@@ -0,0 +1,291 @@
+import json
+import logging
+import math
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, Union
+
+# upper bounds in milliseconds, the last bucket catches everything slower
+LATENCY_BUCKETS_MS = (
+    1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, math.inf
+)
+
+PERCENTILES = (50, 95, 99)
+
+span_log = logging.getLogger("spans")
+
+
+class LatencyHistogram:
+    __slots__ = [
+        "__counts_",
+        "__count_",
+        "__sum_",
+        "__max_"
+    ]
+
+    __counts_: list
+    __count_: int
+    __sum_: float
+    __max_: float
+
+    def __init__(self) -> None:
+        self.__counts_ = [0] * len(LATENCY_BUCKETS_MS)
+        self.__count_ = 0
+        self.__sum_ = 0.0
+        self.__max_ = 0.0
+
+    @property
+    def counts(self) -> list:
+        return list(self.__counts_)
+
+    @property
+    def count(self) -> int:
+        return self.__count_
+
+    @property
+    def sum(self) -> float:
+        return self.__sum_
+
+    @property
+    def max(self) -> float:
+        return self.__max_
+
+    def observe(self, value_ms: float) -> None:
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if value_ms <= bound:
+                self.__counts_[index] += 1
+                break
+
+        self.__count_ += 1
+        self.__sum_ += value_ms
+        self.__max_ = max(self.__max_, value_ms)
+
+    def merge(self, counts: list, total: float, maximum: float) -> None:
+        for index, bucket_count in enumerate(counts):
+            self.__counts_[index] += bucket_count
+
+        self.__count_ += sum(counts)
+        self.__sum_ += total
+        self.__max_ = max(self.__max_, maximum)
+
+    def percentile(self, percent: float) -> float:
+        # upper bound of the bucket holding the percentile, never above the max
+        if self.__count_ == 0:
+            return 0.0
+
+        rank = math.ceil(self.__count_ * percent / 100)
+        seen = 0
+
+        for bound, bucket_count in zip(LATENCY_BUCKETS_MS, self.__counts_):
+            seen += bucket_count
+
+            if seen >= rank:
+                return min(bound, self.__max_)
+
+        return self.__max_
+
+
+class MetricsRegistry:
+    """
+        Per-stage latency histograms and event counters. Stages are timed with
+        span(), which also logs each span with its correlation id on the
+        "spans" logger, so the hops of a single command can be lined up.
+    """
+
+    __slots__ = [
+        "__histograms_",
+        "__counters_"
+    ]
+
+    __histograms_: dict
+    __counters_: dict
+
+    def __init__(self) -> None:
+        self.__histograms_ = {}
+        self.__counters_ = {}
+
+    @property
+    def counters(self) -> dict:
+        return dict(self.__counters_)
+
+    def increment(self, name: str, value: int = 1) -> None:
+        self.__counters_[name] = self.__counters_.get(name, 0) + value
+
+    def histogram(self, stage: str) -> LatencyHistogram:
+        if stage not in self.__histograms_:
+            self.__histograms_[stage] = LatencyHistogram()
+
+        return self.__histograms_[stage]
+
+    def observe(
+        self,
+        stage: str,
+        value_ms: float,
+        correlation_id: Union[str, list] = None
+    ) -> None:
+        """
+            correlation_id may also be a list when the stage served several
+            commands at once (a receive, a reply batch); the span is then
+            logged once per command and counted once in the histogram.
+        """
+        self.histogram(stage).observe(value_ms)
+
+        if correlation_id is None or isinstance(correlation_id, str):
+            correlation_id = [correlation_id]
+
+        for command_correlation_id in correlation_id:
+            span_log.info(
+                "%s took %.1f ms", stage, value_ms,
+                extra={
+                    "stage": stage,
+                    "duration_ms": round(value_ms, 3),
+                    "correlation_id": command_correlation_id
+                }
+            )
+
+    @contextmanager
+    def span(
+        self,
+        stage: str,
+        correlation_id: Union[str, list] = None
+    ) -> Iterator[None]:
+        started_at = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(
+                stage, (time.perf_counter() - started_at) * 1000, correlation_id
+            )
+
+    def summary(self) -> dict:
+        return {
+            stage: {
+                "count": histogram.count,
+                **{
+                    f"p{percent}": histogram.percentile(percent)
+                    for percent in PERCENTILES
+                }
+            }
+            for stage, histogram in self.__histograms_.items()
+        }
+
+    def snapshot(self) -> dict:
+        # plain data, so it can cross a process boundary and be merged there
+        return {
+            "histograms": {
+                stage: (histogram.counts, histogram.sum, histogram.max)
+                for stage, histogram in self.__histograms_.items()
+            },
+            "counters": dict(self.__counters_)
+        }
+
+    def merge(self, snapshot: dict) -> None:
+        for stage, (counts, total, maximum) in snapshot["histograms"].items():
+            self.histogram(stage).merge(counts, total, maximum)
+
+        for name, value in snapshot["counters"].items():
+            self.increment(name, value)
+
+    def reset(self) -> None:
+        self.__histograms_ = {}
+        self.__counters_ = {}
+
+    def render_emf(self, namespace: str) -> list:
+        """
+            One CloudWatch Embedded Metric Format document per stage, with the
+            bucket bounds as Values so CloudWatch can compute the percentiles.
+        """
+        timestamp = int(time.time() * 1000)
+        documents = []
+
+        for stage, histogram in self.__histograms_.items():
+            values, counts = [], []
+
+            for bound, bucket_count in zip(LATENCY_BUCKETS_MS, histogram.counts):
+                if bucket_count > 0:
+                    values.append(min(bound, histogram.max))
+                    counts.append(bucket_count)
+
+            if not counts:
+                continue
+
+            documents.append({
+                "_aws": {
+                    "Timestamp": timestamp,
+                    "CloudWatchMetrics": [{
+                        "Namespace": namespace,
+                        "Dimensions": [["Stage"]],
+                        "Metrics": [{"Name": "Latency", "Unit": "Milliseconds"}]
+                    }]
+                },
+                "Stage": stage,
+                "Latency": {"Values": values, "Counts": counts}
+            })
+
+        if self.__counters_:
+            documents.append({
+                "_aws": {
+                    "Timestamp": timestamp,
+                    "CloudWatchMetrics": [{
+                        "Namespace": namespace,
+                        "Dimensions": [[]],
+                        "Metrics": [
+                            {"Name": name, "Unit": "Count"}
+                            for name in self.__counters_
+                        ]
+                    }]
+                },
+                **self.__counters_
+            })
+
+        return documents
+
+    def render_prometheus(self, prefix: str) -> str:
+        lines = [
+            f"# HELP {prefix}_latency_ms Time spent per stage.",
+            f"# TYPE {prefix}_latency_ms histogram",
+        ]
+
+        for stage, histogram in self.__histograms_.items():
+            cumulative = 0
+
+            for bound, bucket_count in zip(LATENCY_BUCKETS_MS, histogram.counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == math.inf else str(bound)
+
+                lines.append(
+                    f'{prefix}_latency_ms_bucket{{stage="{stage}",le="{le}"}} '
+                    f"{cumulative}"
+                )
+
+            lines.append(
+                f'{prefix}_latency_ms_sum{{stage="{stage}"}} {histogram.sum:.3f}'
+            )
+            lines.append(
+                f'{prefix}_latency_ms_count{{stage="{stage}"}} {histogram.count}'
+            )
+
+        for name, value in self.__counters_.items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def write_metrics_file(path: str, text: str) -> None:
+    # written aside and renamed so a scraper never reads half a file
+    with open(f"{path}.tmp", "w", encoding="utf-8") as metrics_file:
+        metrics_file.write(text)
+
+    os.replace(f"{path}.tmp", path)
+
+
+def emf_lines(registry: MetricsRegistry, namespace: str) -> str:
+    return "".join(
+        json.dumps(document) + "\n" for document in registry.render_emf(namespace)
+    )
+
+
+metrics = MetricsRegistry()
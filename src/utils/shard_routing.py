@@ -0,0 +1,42 @@
+from typing import NamedTuple
+
+
+class HomeShard(NamedTuple):
+    name: str
+    # queue the shard's consumer reads commands from
+    queue_url: str
+    backend_base_url: str
+
+
+# Every home and the fans it drives. The Lambda posts each command to the
+# queue of its fan's shard and every consumer serves a single shard, so a slow
+# or offline home only holds up its own fans. A home too busy for one consumer
+# process is split into several shards on the same backend, each with its own
+# queue; a fan group stays within one.
+HOME_SHARDS = {
+    "home": HomeShard(
+        name="home",
+        queue_url="XXXXXXXXXXXXXXXXXXXXXX",
+        backend_base_url="XXXXXXXXXXXXXXXXXXXXXX"
+    ),
+}
+
+# endpoint_id -> shard name, fans not listed belong to DEFAULT_SHARD
+FAN_SHARDS = {
+    "0": "home",
+    "4": "home",
+}
+
+DEFAULT_SHARD = "home"
+
+
+def get_shard(name: str) -> HomeShard:
+    if name not in HOME_SHARDS:
+        raise KeyError(f"unknown home shard {name}")
+
+    return HOME_SHARDS[name]
+
+
+def shard_for_fan(fan_id: object) -> HomeShard:
+    # endpoint ids arrive as strings from Alexa and as ints from commands
+    return get_shard(FAN_SHARDS.get(str(fan_id), DEFAULT_SHARD))
@@ -0,0 +1,56 @@
+import json
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library is used without it
+    orjson = None
+
+
+@lru_cache(maxsize=None)
+def slot_properties(cls: type) -> tuple:
+    # a "__speed_" slot backs the public "speed" property
+    return tuple(
+        slot[2:-1]
+        for klass in reversed(cls.__mro__)
+        for slot in getattr(klass, "__slots__", ())
+        if slot.startswith("__") and slot.endswith("_")
+    )
+
+
+@lru_cache(maxsize=None)
+def slot_property_names(cls: type) -> frozenset:
+    return frozenset(slot_properties(cls))
+
+
+def build_dict_slot_properties(obj: object) -> dict:
+    return {
+        name: value for name in slot_properties(type(obj))
+        if (value := getattr(obj, name)) is not None
+    }
+
+
+def dumps(obj: object) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+
+    return json.dumps(obj)
+
+
+def loads(s: str) -> object:
+    if orjson is not None:
+        return orjson.loads(s)
+
+    return json.loads(s)
+
+
+def encode_slot_properties(obj: object) -> str:
+    return dumps(build_dict_slot_properties(obj))
+
+
+def decode_slot_properties(cls: type, s: str) -> object:
+    # constructor arguments mirror the slot properties; passing the decoded
+    # values keeps defaults such as a fresh correlation id from being built
+    names = slot_property_names(cls)
+
+    return cls(**{key: value for key, value in loads(s).items() if key in names})
@@ -0,0 +1,62 @@
+import json
+import logging as lg
+import random
+import zlib
+
+CORRELATION_ID_FIELD = "correlation_id"
+
+# LogRecord attributes that are not worth repeating in every json line
+RESERVED_RECORD_FIELDS = frozenset(vars(lg.LogRecord("", 0, "", 0, "", (), None)))
+
+
+class JsonFormatter(lg.Formatter):
+    """
+        One json object per line; anything passed through extra= ends up as
+        a field of its own, so records can be filtered by correlation_id.
+    """
+
+    def format(self, record: lg.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "function": record.funcName,
+            "message": record.getMessage(),
+        }
+
+        entry.update(
+            (name, value) for name, value in vars(record).items()
+            if name not in RESERVED_RECORD_FIELDS and name != "message"
+        )
+
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(lg.Filter):
+    """
+        Keeps sample_rate of the records below min_level and every record at
+        or above it. Records sharing a correlation_id are kept or dropped
+        together, so a sampled command can still be followed end to end.
+    """
+
+    def __init__(self, sample_rate: float, min_level: int = lg.WARNING) -> None:
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.min_level = min_level
+
+    def filter(self, record: lg.LogRecord) -> bool:
+        if record.levelno >= self.min_level or self.sample_rate >= 1:
+            return True
+
+        correlation_id = getattr(record, CORRELATION_ID_FIELD, None)
+
+        if correlation_id is None:
+            return random.random() < self.sample_rate
+
+        bucket = zlib.crc32(str(correlation_id).encode("utf-8")) % 10000
+
+        return bucket < self.sample_rate * 10000
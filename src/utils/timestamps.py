@@ -0,0 +1,6 @@
+import time
+
+
+def get_utc_timestamp(seconds: float = None) -> str:
+    # the ISO 8601 form Alexa expects in timeOfSample
+    return time.strftime("%Y-%m-%dT%H:%M:%S.00Z", time.gmtime(seconds))
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the modules import each other from src, as the Lambda and the consumer do
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
@@ -0,0 +1,121 @@
+import pytest
+
+from clients import circuit_breaker
+from clients.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    fake_clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker, "time", fake_clock)
+    return fake_clock
+
+
+def open_breaker(breaker: CircuitBreaker, failures: int) -> None:
+    for _ in range(failures):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_opens_after_threshold_consecutive_failures(clock: FakeClock) -> None:
+    breaker = CircuitBreaker("fans", failure_threshold=3, reset_timeout=10)
+
+    open_breaker(breaker, 2)
+    assert breaker.state == CLOSED
+
+    open_breaker(breaker, 1)
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.before_call()
+
+    assert raised.value.host == "fans"
+    assert raised.value.retry_in == pytest.approx(10)
+
+
+def test_success_resets_the_failure_count(clock: FakeClock) -> None:
+    breaker = CircuitBreaker("fans", failure_threshold=3, reset_timeout=10)
+
+    open_breaker(breaker, 2)
+    breaker.record_success()
+    open_breaker(breaker, 2)
+
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_a_single_trial_through(clock: FakeClock) -> None:
+    breaker = CircuitBreaker("fans", failure_threshold=1, reset_timeout=10)
+    open_breaker(breaker, 1)
+
+    clock.now += 9.9
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.now += 0.1
+    breaker.before_call()
+
+    assert breaker.state == HALF_OPEN
+
+    # the trial is still in flight
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_successful_trial_closes_the_circuit(clock: FakeClock) -> None:
+    breaker = CircuitBreaker("fans", failure_threshold=2, reset_timeout=10)
+    open_breaker(breaker, 2)
+
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_success()
+
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+    # a single failure no longer opens it, the count started over
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_failed_trial_reopens_the_circuit(clock: FakeClock) -> None:
+    breaker = CircuitBreaker("fans", failure_threshold=5, reset_timeout=10)
+    open_breaker(breaker, 5)
+
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.before_call()
+
+    assert raised.value.retry_in == pytest.approx(10)
+
+
+def test_trial_that_never_reports_back_is_retried(clock: FakeClock) -> None:
+    breaker = CircuitBreaker("fans", failure_threshold=1, reset_timeout=10)
+    open_breaker(breaker, 1)
+
+    clock.now += 10
+    breaker.before_call()
+
+    clock.now += 10
+    breaker.before_call()
+
+    assert breaker.state == HALF_OPEN
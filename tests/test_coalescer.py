@@ -0,0 +1,141 @@
+from commands import ArnoCommand
+from consumer.coalescer import CommandBacklog, coalesce_commands, merge_commands
+
+
+def fan_command(fan_id: str, correlation_id: str, **properties) -> ArnoCommand:
+    return ArnoCommand(fan_id=fan_id, correlation_id=correlation_id, **properties)
+
+
+def group_command(correlation_id: str, **properties) -> ArnoCommand:
+    return ArnoCommand(
+        fan_id="all",
+        fan_ids=["0", "4"],
+        correlation_id=correlation_id,
+        **properties
+    )
+
+
+def summarize(coalesced: list) -> list:
+    return [
+        (merged.fan_id, [correlation_id for correlation_id, _ in callers])
+        for merged, callers in coalesced
+    ]
+
+
+def test_later_commands_win_property_by_property() -> None:
+    merged = merge_commands([
+        fan_command("0", "a", speed=30, state=True),
+        fan_command("0", "b", rotation_direction=1),
+        fan_command("0", "c", speed=70),
+    ])
+
+    assert (merged.speed, merged.state, merged.rotation_direction) == (70, True, 1)
+    assert merged.correlation_id == "c"
+
+
+def test_merged_command_waits_for_the_most_patient_caller() -> None:
+    merged = merge_commands([
+        fan_command("0", "a", speed=30, deadline=10.0),
+        fan_command("0", "b", speed=70, deadline=20.0),
+    ])
+
+    assert merged.deadline == 20.0
+
+    # a caller without a deadline leaves the merged command without one
+    merged = merge_commands([
+        fan_command("0", "a", speed=30, deadline=10.0),
+        fan_command("0", "b", speed=70),
+    ])
+
+    assert merged.deadline is None
+
+
+def test_state_report_only_when_every_command_is_one() -> None:
+    assert merge_commands([
+        fan_command("0", "a", state_report=True),
+        fan_command("0", "b", state_report=True),
+    ]).state_report
+
+    assert not merge_commands([
+        fan_command("0", "a", state_report=True),
+        fan_command("0", "b", speed=70),
+    ]).state_report
+
+
+def test_commands_are_grouped_per_fan_in_order_of_first_arrival() -> None:
+    coalesced = coalesce_commands([
+        fan_command("4", "a", speed=10),
+        fan_command("0", "b", speed=30),
+        fan_command("4", "c", speed=20),
+        fan_command("0", "d", speed=70),
+    ])
+
+    assert summarize(coalesced) == [("4", ["a", "c"]), ("0", ["b", "d"])]
+    assert [merged.speed for merged, _ in coalesced] == [20, 70]
+
+
+def test_callers_keep_their_reply_queues() -> None:
+    coalesced = coalesce_commands([
+        ArnoCommand(fan_id="0", correlation_id="a", speed=10, reply_to="q1"),
+        ArnoCommand(fan_id="0", correlation_id="b", speed=20, reply_to="q2"),
+    ])
+
+    assert coalesced[0][1] == [("a", "q1"), ("b", "q2")]
+
+
+def test_group_command_splits_the_runs_of_its_fans() -> None:
+    coalesced = coalesce_commands([
+        fan_command("0", "a", speed=30),
+        group_command("b", state=False),
+        fan_command("0", "c", speed=70),
+    ])
+
+    assert summarize(coalesced) == [("0", ["a"]), ("all", ["b"]), ("0", ["c"])]
+    assert [merged.speed for merged, _ in coalesced] == [30, None, 70]
+
+
+def test_fan_command_splits_the_runs_of_its_groups() -> None:
+    coalesced = coalesce_commands([
+        group_command("a", state=True),
+        fan_command("4", "b", speed=30),
+        group_command("c", state=False),
+    ])
+
+    assert summarize(coalesced) == [("all", ["a"]), ("4", ["b"]), ("all", ["c"])]
+
+
+def test_group_command_leaves_other_fans_merging() -> None:
+    coalesced = coalesce_commands([
+        fan_command("1", "a", speed=30),
+        group_command("b", state=False),
+        fan_command("1", "c", speed=70),
+    ])
+
+    assert summarize(coalesced) == [("1", ["a", "c"]), ("all", ["b"])]
+
+
+def test_backlog_takes_the_rest_of_the_run() -> None:
+    backlog = CommandBacklog()
+    commands = [
+        fan_command("0", "a", speed=30),
+        fan_command("4", "b", speed=10),
+        fan_command("0", "c", speed=50),
+        group_command("d", state=False),
+        fan_command("0", "e", speed=70),
+    ]
+
+    for index, command in enumerate(commands):
+        backlog.add(command, f"receipt-{index}")
+
+    assert backlog.take(commands[0]) == [
+        (commands[0], "receipt-0"), (commands[2], "receipt-2")
+    ]
+
+    # taken along with the first one, its own turn finds nothing
+    assert backlog.take(commands[2]) == []
+    assert len(backlog) == 3
+
+    assert backlog.take(commands[1]) == [(commands[1], "receipt-1")]
+    assert backlog.take(commands[3]) == [(commands[3], "receipt-3")]
+    assert backlog.take(commands[4]) == [(commands[4], "receipt-4")]
+    assert len(backlog) == 0
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from consumer import reply_buffer
+from consumer.reply_buffer import DROP_NEWEST, DROP_OLDEST, ReplyBuffer
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(reply_buffer, "backoff_delay", lambda attempt: 0)
+
+
+class RecordingSender:
+    """
+        send_batch stand-in, fails the messages listed in fail_once the first
+        time they are sent.
+    """
+
+    def __init__(self, fail_once: tuple = ()) -> None:
+        self.batches = []
+        self.fail_once = set(fail_once)
+
+    async def __call__(self, batch: list) -> list:
+        self.batches.append(batch)
+        failed = [
+            index for index, (_, message, _) in enumerate(batch)
+            if message in self.fail_once
+        ]
+        self.fail_once.difference_update(batch[index][1] for index in failed)
+        return failed
+
+    @property
+    def sent(self) -> list:
+        return [message for batch in self.batches for _, message, _ in batch]
+
+
+async def drain_until_sent(buffer: ReplyBuffer, sender: RecordingSender) -> None:
+    drain = asyncio.ensure_future(buffer.drain(sender, batch_size=2))
+
+    try:
+        for _ in range(200):
+            await asyncio.sleep(0.005)
+
+            if buffer.pending == 0:
+                break
+    finally:
+        drain.cancel()
+        await asyncio.gather(drain, return_exceptions=True)
+
+
+def test_replies_are_sent_in_order_to_their_queues() -> None:
+    async def scenario() -> list:
+        buffer = ReplyBuffer()
+        sender = RecordingSender()
+
+        buffer.push("a", {}, queue_url="q1")
+        buffer.push("b", {})
+        buffer.push("c", {}, queue_url="q2")
+        await drain_until_sent(buffer, sender)
+
+        return sender.batches
+
+    assert asyncio.run(scenario()) == [
+        [("q1", "a", {}), (None, "b", {})],
+        [("q2", "c", {})],
+    ]
+
+
+def test_failed_replies_are_retried_ahead_of_the_rest() -> None:
+    async def scenario() -> list:
+        buffer = ReplyBuffer()
+        sender = RecordingSender(fail_once=("b",))
+
+        for message in ("a", "b", "c"):
+            buffer.push(message, {})
+
+        await drain_until_sent(buffer, sender)
+
+        return sender.sent
+
+    assert asyncio.run(scenario()) == ["a", "b", "b", "c"]
+
+
+def test_expired_replies_are_dropped_unsent() -> None:
+    async def scenario() -> tuple:
+        buffer = ReplyBuffer()
+        sender = RecordingSender()
+
+        buffer.push("late", {}, deadline=time.time() - 1)
+        buffer.push("on time", {}, deadline=time.time() + 60)
+        buffer.push("no deadline", {})
+        await drain_until_sent(buffer, sender)
+
+        return sender.sent, buffer.expired
+
+    assert asyncio.run(scenario()) == (["on time", "no deadline"], 1)
+
+
+@pytest.mark.parametrize("policy, kept", [
+    (DROP_OLDEST, ["b", "c"]),
+    (DROP_NEWEST, ["a", "b"]),
+])
+def test_overflow_policy(policy: str, kept: list) -> None:
+    async def scenario() -> tuple:
+        buffer = ReplyBuffer(capacity=2, overflow_policy=policy)
+        sender = RecordingSender()
+
+        accepted = [buffer.push(message, {}) for message in ("a", "b", "c")]
+        await drain_until_sent(buffer, sender)
+
+        return accepted, sender.sent, buffer.dropped
+
+    accepted, sent, dropped = asyncio.run(scenario())
+
+    assert accepted == [True, True, policy == DROP_OLDEST]
+    assert sent == kept
+    assert dropped == 1
+
+
+def test_unknown_overflow_policy_is_rejected() -> None:
+    with pytest.raises(ValueError):
+        ReplyBuffer(overflow_policy="drop_random")
+
+
+class FailingSender(RecordingSender):
+    # SQS is down, nothing goes out
+    async def __call__(self, batch: list) -> list:
+        self.batches.append(batch)
+        return list(range(len(batch)))
+
+
+async def crash_while_draining(buffer: ReplyBuffer) -> None:
+    drain = asyncio.ensure_future(buffer.drain(FailingSender()))
+    await asyncio.sleep(0.02)
+    drain.cancel()
+    await asyncio.gather(drain, return_exceptions=True)
+
+
+async def drain_recovered(journal_path: str) -> list:
+    buffer = ReplyBuffer(journal_path=journal_path)
+    sender = RecordingSender()
+    await drain_until_sent(buffer, sender)
+
+    return sender.batches
+
+
+def test_unsent_replies_are_recovered_from_the_journal(tmp_path) -> None:
+    journal_path = str(tmp_path / "replies.journal")
+    deadline = time.time() + 60
+
+    async def before_crash() -> None:
+        buffer = ReplyBuffer(journal_path=journal_path)
+
+        buffer.push("a", {"CorrelationId": "1"}, deadline, "q1")
+        buffer.push("b", {"CorrelationId": "2"}, queue_url="q2")
+        await crash_while_draining(buffer)
+
+    asyncio.run(before_crash())
+
+    assert asyncio.run(drain_recovered(journal_path)) == [
+        [("q1", "a", {"CorrelationId": "1"}), ("q2", "b", {"CorrelationId": "2"})]
+    ]
+
+
+def test_sent_replies_are_not_recovered(tmp_path) -> None:
+    journal_path = str(tmp_path / "replies.journal")
+
+    async def before_restart() -> None:
+        buffer = ReplyBuffer(journal_path=journal_path)
+        buffer.push("a", {})
+        await drain_until_sent(buffer, RecordingSender())
+
+    asyncio.run(before_restart())
+
+    assert asyncio.run(drain_recovered(journal_path)) == []
+
+
+def test_replies_expired_during_the_outage_are_not_sent(tmp_path) -> None:
+    journal_path = str(tmp_path / "replies.journal")
+
+    async def before_crash() -> None:
+        buffer = ReplyBuffer(journal_path=journal_path)
+        buffer.push("late", {}, time.time() + 0.01)
+        buffer.push("on time", {}, time.time() + 60)
+        await crash_while_draining(buffer)
+
+    asyncio.run(before_crash())
+
+    assert asyncio.run(drain_recovered(journal_path)) == [
+        [(None, "on time", {})]
+    ]
+
+
+def test_records_from_older_journals_are_recovered(tmp_path) -> None:
+    journal_path = tmp_path / "replies.journal"
+    journal_path.write_text(
+        # written before deadlines and queue urls were journaled, plus a
+        # torn last line
+        json.dumps(["put", "1", "a", {}]) + "\n"
+        + json.dumps(["put", "2", "b", {}, None]) + "\n"
+        + json.dumps(["ack", "2"]) + "\n"
+        + '["put", "3", "c"',
+        encoding="utf-8"
+    )
+
+    assert asyncio.run(drain_recovered(str(journal_path))) == [[(None, "a", {})]]
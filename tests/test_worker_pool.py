@@ -0,0 +1,122 @@
+import asyncio
+
+from consumer.worker_pool import FanWorkerPool
+
+
+async def record(events: list, name: str, delay: float = 0) -> str:
+    events.append(f"start {name}")
+    await asyncio.sleep(delay)
+    events.append(f"end {name}")
+    return name
+
+
+def test_same_key_runs_in_submission_order() -> None:
+    async def scenario() -> list:
+        pool = FanWorkerPool(max_concurrency=10)
+        events = []
+
+        pool.submit("0", record(events, "slow", 0.05))
+        pool.submit("0", record(events, "fast"))
+        await pool.join()
+
+        return events
+
+    assert asyncio.run(scenario()) == [
+        "start slow", "end slow", "start fast", "end fast"
+    ]
+
+
+def test_different_keys_overlap() -> None:
+    async def scenario() -> list:
+        pool = FanWorkerPool(max_concurrency=10)
+        events = []
+
+        pool.submit("0", record(events, "fan 0", 0.05))
+        pool.submit("4", record(events, "fan 4", 0.01))
+        await pool.join()
+
+        return events
+
+    assert asyncio.run(scenario()) == [
+        "start fan 0", "start fan 4", "end fan 4", "end fan 0"
+    ]
+
+
+def test_group_is_ordered_against_each_of_its_keys() -> None:
+    async def scenario() -> list:
+        pool = FanWorkerPool(max_concurrency=10)
+        events = []
+
+        pool.submit("0", record(events, "fan 0", 0.05))
+        pool.submit_all(("0", "4"), record(events, "group"))
+        pool.submit("4", record(events, "fan 4"))
+        await pool.join()
+
+        return events
+
+    assert asyncio.run(scenario()) == [
+        "start fan 0", "end fan 0",
+        "start group", "end group",
+        "start fan 4", "end fan 4",
+    ]
+
+
+def test_failure_does_not_break_the_key_chain() -> None:
+    async def fail() -> None:
+        raise RuntimeError("backend down")
+
+    async def scenario() -> list:
+        pool = FanWorkerPool(max_concurrency=10)
+        events = []
+
+        pool.submit("0", fail())
+        pool.submit("0", record(events, "next"))
+
+        return await pool.join(), events
+
+    results, events = asyncio.run(scenario())
+
+    assert any(isinstance(result, RuntimeError) for result in results)
+    assert events == ["start next", "end next"]
+
+
+def test_max_concurrency_bounds_running_work() -> None:
+    running = {"now": 0, "most": 0}
+
+    async def work() -> None:
+        running["now"] += 1
+        running["most"] = max(running["most"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+
+    async def scenario() -> None:
+        pool = FanWorkerPool(max_concurrency=2)
+
+        for key in range(6):
+            pool.submit(key, work())
+
+        await pool.join()
+
+    asyncio.run(scenario())
+
+    assert running["most"] == 2
+
+
+def test_wait_for_room_holds_back_at_max_pending() -> None:
+    async def scenario() -> tuple:
+        pool = FanWorkerPool(max_concurrency=10, max_pending=2)
+        release = asyncio.Event()
+
+        pool.submit("0", release.wait())
+        pool.submit("4", release.wait())
+
+        room = asyncio.ensure_future(pool.wait_for_room())
+        await asyncio.sleep(0.01)
+        blocked = not room.done()
+
+        release.set()
+        await asyncio.wait_for(room, 1)
+
+        return blocked, pool.pending
+
+    assert asyncio.run(scenario()) == (True, 0)